@@ -0,0 +1,148 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   annIndex.py
+#   Purpose:    Approximate nearest neighbour search over the
+#               recipe feature vectors using random-projection
+#               locality sensitive hashing.
+#
+########################################################
+
+import time
+import numpy as np
+import scipy.sparse as sp
+from recipeSimilarity import topK
+
+
+class RandomProjectionIndex:
+    """
+    Locality sensitive hashing index for cosine similarity. Each table hashes a
+    recipe to the signs of its projections onto numBits random hyperplanes, so
+    similar recipes tend to land in the same bucket. A query only looks at the
+    recipes sharing a bucket with it in at least one table and then re-ranks that
+    shortlist exactly.
+
+    The shortlist is about the same share of the recipes at any size (5.6% with the
+    defaults, which find 39% of the exact top 10 on 100,000 synthetic recipes), so
+    fewer bits or more tables raise recall only by comparing more recipes.
+    recallAtK measures recall and speed against exact search on the dataset being used.
+    """
+
+    def __init__(self, featureVector, numTables=16, numBits=12, multiProbe=True, seed=0):
+        """
+        :param featureVector: Sparse matrix with one L2 normalized row per recipe.
+        :param numTables: Number of hash tables. More tables give better recall but
+                          larger shortlists.
+        :param numBits: Hyperplanes per table. More bits give smaller buckets.
+        :param multiProbe: Also look in the buckets one bit away from the query's bucket.
+        :param seed: Seed for the random hyperplanes.
+        """
+        if numBits > 30:
+            raise ValueError("numBits must be at most 30.")
+        self.features = sp.csr_matrix(featureVector, copy=False)
+        self.numTables = numTables
+        self.numBits = numBits
+        self.multiProbe = multiProbe
+
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((self.features.shape[1], numTables * numBits)).astype(np.float32)
+        self.powers = (1 << np.arange(numBits)).astype(np.int64)
+
+        #hash in blocks so the dense projections never cover the whole corpus at once
+        codes = np.concatenate([self._hash(self.features[start:start + 65536])
+                                for start in range(0, self.features.shape[0], 65536)]
+                               or [np.zeros((0, numTables), dtype=np.int64)])
+        #every table's codes are offset by the table number and sorted together, so a
+        #bucket is one run of rows and all probes of a query take one search
+        keys = (codes + (np.arange(numTables, dtype=np.int64) << numBits)).T.ravel()
+        order = np.argsort(keys, kind='stable')
+        self.sortedKeys = keys[order]
+        self.rows = (order % max(codes.shape[0], 1)).astype(np.int32)
+        #bucket of the query, and with multiProbe the buckets one bit away from it
+        self.probeMasks = np.concatenate([[0], self.powers]) if multiProbe else np.zeros(1, dtype=np.int64)
+
+    def _hash(self, vectors):
+        projections = np.asarray(vectors @ self.planes)
+        bits = (projections > 0).reshape(projections.shape[0], self.numTables, self.numBits)
+        return bits.astype(np.int64) @ self.powers
+
+    def candidates(self, queryVector):
+        """
+        :param queryVector: Sparse 1 x M row in the same feature space as the index.
+        :return: Array of rows sharing a bucket with the query.
+        """
+        codes = self._hash(queryVector)[0]
+        probes = ((codes[:, None] ^ self.probeMasks) + (np.arange(self.numTables, dtype=np.int64)[:, None] << self.numBits)).ravel()
+        starts = np.searchsorted(self.sortedKeys, probes, side='left')
+        ends = np.searchsorted(self.sortedKeys, probes, side='right')
+        lengths = ends - starts
+        if lengths.sum() == 0:
+            return np.zeros(0, dtype=np.int32)
+        #positions of every row in every probed bucket, without a loop over the buckets
+        positions = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return np.unique(self.rows[positions])
+
+    def query(self, queryVector, k=10):
+        """
+        Finds the approximate k most similar recipes to a query vector.
+
+        :param queryVector: Sparse 1 x M row in the same feature space as the index.
+        :param k: Number of recipes to return.
+        :return: List of (row, similarity) pairs, most similar first.
+        """
+        rows = self.candidates(queryVector)
+        if len(rows) == 0:
+            return []
+        scores = (self.features[rows] @ queryVector.T).toarray().ravel()
+        top = topK(scores, k)
+        return list(zip(rows[top].tolist(), scores[top].tolist()))
+
+    def similar(self, recipeIdx, k=10):
+        return self.query(self.features[recipeIdx], k)
+
+
+def recallAtK(annIndex, engine, k=10, samples=200, seed=0):
+    """
+    Compares the approximate index against exact search on a random sample of
+    recipes.
+
+    :param annIndex: RandomProjectionIndex to evaluate.
+    :param engine: SimilarityEngine over the same feature vectors.
+    :param k: Number of neighbours to compare.
+    :param samples: Number of recipes to query.
+    :param seed: Seed used to pick the sampled recipes.
+    :return: Dictionary with the mean recall@k, mean shortlist size and the
+             average query time of both methods in milliseconds.
+    """
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(engine), size=min(samples, len(engine)), replace=False)
+    recall = 0.0
+    shortlist = 0
+    annTime = 0.0
+    exactTime = 0.0
+    for recipeIdx in queries:
+        start = time.perf_counter()
+        approx = annIndex.similar(recipeIdx, k)
+        annTime += time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores = engine.similarity(recipeIdx)
+        top = topK(scores, k)
+        exactTime += time.perf_counter() - start
+
+        #compare by score so ties between equally similar recipes are not counted as misses
+        threshold = scores[top].min()
+        recall += sum(1 for _, score in approx if score >= threshold - 1e-6) / len(top)
+        shortlist += len(annIndex.candidates(annIndex.features[recipeIdx]))
+
+    return {"k": k,
+            "samples": len(queries),
+            "recall": recall / len(queries),
+            "meanCandidates": shortlist / len(queries),
+            "annMs": 1000 * annTime / len(queries),
+            "exactMs": 1000 * exactTime / len(queries)}
@@ -0,0 +1,192 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   batchRecommend.py
+#   Purpose:    Writes the most similar recipes for a list of
+#               recipes (or every recipe) to a file without any
+#               prompts, so recommendations can be precomputed.
+#
+########################################################
+
+import os
+import sys
+import csv
+import json
+import argparse
+import multiprocessing
+import numpy as np
+import instrument
+from recipeSimilarity import SimilarityEngine
+from recipeIndex import loadIndex
+from recipeFeatures import addFeatureArguments
+from cosFoodRec import loadEngine
+
+#number of query rows sampled to estimate how much memory a block of queries needs
+BUDGET_SAMPLE = 256
+
+#similarity engine shared with each worker process by initWorker
+workerEngine = None
+
+
+def checkCLA():
+    #CLA argument definitions
+    parser = argparse.ArgumentParser("Write the most similar recipes for many recipes at once.\n")
+    parser.add_argument('--datafile', '-f', type=str, help="File containing cleaned recipe data.")
+    addFeatureArguments(parser)
+    parser.add_argument('--index', '-i', type=str, help="Load a prebuilt recommender index instead of refitting the data.")
+    parser.add_argument('--queries', '-q', type=str, help="File with one recipe title (or row with --byid) per line.")
+    parser.add_argument('--byid', action='store_true', help="Queries are recipe rows instead of titles.")
+    parser.add_argument('--all', '-A', action='store_true', help="Find recommendations for every recipe instead of a file of queries.")
+    parser.add_argument('--output', '-o', type=str, required=True, help="File to write recommendations to (.jsonl or .csv).")
+    parser.add_argument('--neighbours', '-k', type=int, default=10, help="Number of recommendations per recipe.")
+    parser.add_argument('--workers', '-w', type=int, default=1, help="Number of processes to score queries with.")
+    parser.add_argument('--budget', '-m', type=int, default=256, help="Memory (in MB) the similarity scores of a block of queries may take.")
+    instrument.addArguments(parser)
+    args = parser.parse_args()
+
+    if not args.index and not args.datafile:
+        parser.error("--datafile is required unless an --index is given.")
+    if not args.queries and not args.all:
+        parser.error("Give a --queries file or use --all.")
+    if not (args.output.endswith(".jsonl") or args.output.endswith(".csv")):
+        parser.error("--output must be a .jsonl or .csv file.")
+    return args
+
+
+def initWorker(indexDir, featureVector):
+    """
+    Runs once in every worker process. Indexes are memory-mapped again by each
+    worker (sharing the same pages), otherwise the feature vectors are sent once.
+    """
+    global workerEngine
+    if indexDir is not None:
+        index = loadIndex(indexDir)
+        workerEngine = SimilarityEngine.fromIndex(index)
+    else:
+        workerEngine = SimilarityEngine(featureVector)
+
+
+def scoreBlock(task):
+    """
+    Scores a block of queries inside of a worker process.
+
+    :param task: (rows, k) with the rows of the queries and the number of neighbours.
+    :return: (indices, scores) arrays from SimilarityEngine.neighbours.
+    """
+    rows, k = task
+    return workerEngine.neighbours(k, len(rows), rows)
+
+
+def blockSizeFor(engine, budget, workers=1):
+    """
+    Estimates how many queries can be scored at once within a memory budget. Every
+    query's scores are a sparse row with one entry per recipe sharing a word with
+    it, so a sample of queries gives the average size of a row.
+
+    :param engine: SimilarityEngine being queried.
+    :param budget: Memory in bytes shared by every worker.
+    :param workers: Number of blocks being scored at the same time.
+    :return: Number of queries to score per block.
+    """
+    sample = np.unique(np.linspace(0, len(engine) - 1, min(BUDGET_SAMPLE, len(engine))).astype(np.int64))
+    nnz = (engine.features[sample] @ engine.featuresT).nnz / max(len(sample), 1)
+    #each score is stored as a float64 value and an int32 column, plus a copy while it is sorted
+    bytesPerQuery = max(nnz, 1) * 12 * 2
+    return max(1, int(budget / (workers * bytesPerQuery)))
+
+
+def readQueries(args, store, removed):
+    """
+    :return: List of (query, row) pairs, with a row of -1 for queries that were not found.
+    """
+    if args.all:
+        return [(store[row].title, row) for row in range(len(store)) if removed is None or not removed[row]]
+
+    queries = []
+    with open(args.queries, encoding='utf-8') as f:
+        for line in f:
+            query = line.strip()
+            if not query:
+                continue
+            if args.byid:
+                row = int(query) if query.isdigit() and int(query) < len(store) else -1
+            else:
+                row = store.findTitle(query)
+            if row >= 0 and removed is not None and removed[row]:
+                row = -1
+            queries.append((query, row))
+    return queries
+
+
+def writeResults(out, writer, store, query, row, indices, scores):
+    neighbours = [(int(i), float(s)) for i, s in zip(indices, scores) if i >= 0]
+    if writer is None:
+        out.write(json.dumps({"query": query, "row": row,
+                              "neighbours": [{"row": i, "title": store[i].title, "score": s}
+                                             for i, s in neighbours]}) + '\n')
+    else:
+        for rank, (i, s) in enumerate(neighbours, 1):
+            writer.writerow([query, row, rank, i, store[i].title, s])
+
+
+def main():
+    args = checkCLA()
+    instrument.start(args, "batchRecommend")
+
+    print("Loading data...", end='', flush=True)
+    with instrument.stage("load"):
+        store, engine, terms, idf = loadEngine(args)
+    #workers memory-map the index again, or are sent the fitted feature vectors
+    indexDir = os.getcwd() + '\\Indexes\\' + args.index if args.index else None
+    featureVector = None if args.index else engine.features
+
+    queries = readQueries(args, store, engine.removed)
+    missing = [query for query, row in queries if row < 0]
+    for query in missing:
+        print("\nNo recipe found for \"" + query + "\".", end='', file=sys.stderr)
+    rows = np.asarray([row for query, row in queries if row >= 0], dtype=np.int64)
+
+    blockSize = blockSizeFor(engine, args.budget * 1024 * 1024, args.workers)
+    blocks = [(rows[i:i+blockSize], args.neighbours) for i in range(0, len(rows), blockSize)]
+    print("done.\nScoring", len(rows), "recipes in blocks of", blockSize, "...", flush=True)
+
+    pool = None
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=initWorker, initargs=(indexDir, featureVector))
+        #imap hands back blocks in the order they were sent
+        results = pool.imap(scoreBlock, blocks)
+    else:
+        results = (engine.neighbours(k, len(blockRows), blockRows) for blockRows, k in blocks)
+
+    found = iter([(query, row) for query, row in queries if row >= 0])
+    progress = instrument.Progress("Current row", len(rows))
+    try:
+        with open(args.output, 'w', newline='', encoding='utf-8') as out, instrument.stage("scoring"):
+            writer = None
+            if args.output.endswith(".csv"):
+                writer = csv.writer(out)
+                writer.writerow(['query', 'queryRow', 'rank', 'row', 'title', 'score'])
+            for indices, scores in results:
+                for i in range(len(indices)):
+                    query, row = next(found)
+                    writeResults(out, writer, store, query, row, indices[i], scores[i])
+                progress.update(len(indices))
+        progress.finish(newline=False)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    instrument.count('queries', len(rows))
+    instrument.count('queriesNotFound', len(missing))
+    print("\nCompleted." + (" " + str(len(missing)) + " queries were not found." if missing else ""))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   benchPipeline.py
+#   Purpose:    Times every stage of the pipeline (vocabulary
+#               load, cleaning, feature build, index build and
+#               queries) on synthetic datasets and writes the
+#               results to a json file that can be compared
+#               between versions.
+#
+########################################################
+
+import os
+import sys
+import ast
+import json
+import time
+import argparse
+import platform
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cleanRecipeData
+from ingredientVocab import IngredientVocab
+from lineCache import LineCache
+from recipeFeatures import fitFeatures
+from recipeSimilarity import SimilarityEngine
+from recipeIndex import saveIndex, loadIndex
+from recipeStore import RecipeStore
+import instrument
+from instrument import peakRSS
+from synthCorpus import makeCorpus, useWorkDir
+
+STAGES = ["generate", "vocabulary", "cleaning", "features", "index", "query"]
+
+
+def commitID():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class StageResults:
+    """
+    Times stages one after another and keeps what each one measured.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, stage, *args):
+        """
+        Runs stage(*args) and records its wall time and the peak memory so far.
+
+        :param stage: Function returning (result, dictionary of extra measurements).
+        :return: The stage's result.
+        """
+        print("\n[" + name + "]", flush=True)
+        start = time.perf_counter()
+        result, measured = stage(*args)
+        seconds = time.perf_counter() - start
+        self.stages[name] = dict(seconds=seconds, peakRssMB=peakRSS(), **measured)
+        print("\n[" + name + "] {:.2f} s".format(seconds), flush=True)
+        return result
+
+
+def vocabularyStage():
+    ingredients = IngredientVocab(cleanRecipeData.loadIngredients(useCache=False))
+    return ingredients, {"ingredients": len(ingredients)}
+
+
+def cleaningStage(rawFile, ingredients, rows, workers):
+    sheet = pd.read_csv(rawFile, nrows=rows or None)
+    lines = sum(len(cleanRecipeData.parseRecipe(recipe)) for recipe in sheet['ingredients'])
+    before = instrument.counters.copy()
+    start = time.perf_counter()
+    cleanRecipeData.cleanIngredients(sheet, ingredients, 'ingredients', workers, cache=LineCache(None))
+    seconds = time.perf_counter() - start
+    counts = instrument.counters - before
+    return None, {"rows": len(sheet), "lines": lines,
+                  "rowsPerSec": len(sheet) / seconds, "linesPerSec": lines / seconds,
+                  "linesDropped": counts['linesDropped'], "vocabHits": counts['vocabHits'],
+                  "fallbacks": counts['fallbacks']}
+
+
+def featureStage(cleanedFile):
+    sheet = pd.read_csv(cleanedFile)
+    recipes = [ast.literal_eval(recipe) for recipe in sheet['ingredients']]
+    featureVector, terms, idf = fitFeatures(recipes)
+    return (sheet, featureVector, terms, idf), {"rows": featureVector.shape[0], "features": len(terms),
+                                                "nnz": int(featureVector.nnz),
+                                                "featureMB": (featureVector.data.nbytes + featureVector.indices.nbytes +
+                                                              featureVector.indptr.nbytes) / 2**20}
+
+
+def indexStage(indexDir, sheet, featureVector, terms, idf, neighbours):
+    neighbourIdx, neighbourSim = SimilarityEngine(featureVector).neighbours(neighbours)
+    saveIndex(indexDir, terms, idf, featureVector, neighbourIdx, neighbourSim, RecipeStore.fromSheet(sheet))
+    return None, {"neighbours": neighbours}
+
+
+def queryStage(indexDir, queries, k, seed):
+    index = loadIndex(indexDir)
+    engine = SimilarityEngine.fromIndex(index)
+    rows = np.random.default_rng(seed).integers(len(engine), size=queries)
+    latencies = np.zeros(len(rows))
+    returned = 0
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        #the recipe itself comes first, like in cosFoodRec.py
+        ranked = engine.ranked(int(row), k + 1)
+        recommended = [ranked[j] for j in range(1, min(k + 1, len(ranked)))]
+        latencies[i] = 1000 * (time.perf_counter() - start)
+        returned += len(recommended)
+    return None, {"queries": queries, "k": k, "meanResults": returned / max(queries, 1),
+                  "p50Ms": float(np.percentile(latencies, 50)), "p99Ms": float(np.percentile(latencies, 99)),
+                  "meanMs": float(latencies.mean())}
+
+
+def benchmark(rows, args):
+    """
+    Runs the selected stages on a synthetic corpus of the given size.
+
+    :return: Dictionary of each stage's measurements.
+    """
+    results = StageResults()
+    vocabFile, rawFile, cleanedFile = results.run("generate", lambda: (makeCorpus(rows, args.seed), {"rows": rows}))
+    indexDir = os.getcwd() + "\\Indexes\\synthetic-" + str(rows) + "-" + str(args.seed)
+
+    if "vocabulary" in args.stages or "cleaning" in args.stages:
+        ingredients = results.run("vocabulary", vocabularyStage)
+    if "cleaning" in args.stages:
+        results.run("cleaning", cleaningStage, rawFile, ingredients, args.cleanrows, args.workers)
+    if "features" in args.stages or "index" in args.stages:
+        sheet, featureVector, terms, idf = results.run("features", featureStage, cleanedFile)
+    if "index" in args.stages:
+        results.run("index", indexStage, indexDir, sheet, featureVector, terms, idf, args.neighbours)
+    if "query" in args.stages:
+        if not os.path.isdir(indexDir):
+            sys.exit("No index for " + str(rows) + " recipes to query. Include the index stage.")
+        results.run("query", queryStage, indexDir, args.queries, args.k, args.seed)
+    return results.stages
+
+
+def compare(oldFile, new):
+    """
+    Prints how long each stage took compared to an earlier results file.
+    """
+    with open(oldFile, encoding='utf-8') as f:
+        old = json.load(f)
+    print("\nCompared with " + oldFile + " (" + str(old.get("commit")) + "):")
+    for rows, stages in new["runs"].items():
+        for name, stage in stages.items():
+            before = old["runs"].get(rows, {}).get(name)
+            #datasets are only generated when missing, so their time isn't comparable
+            if before is None or name == "generate":
+                continue
+            for key in ("seconds", "p50Ms", "p99Ms"):
+                if key in stage and key in before and before[key] > 0:
+                    print("  {:>8} {:<11} {:<8} {:10.3f} -> {:10.3f} ({:+.1f}%)".format(
+                        rows, name, key, before[key], stage[key], 100 * (stage[key] / before[key] - 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser("Time every stage of the pipeline on synthetic datasets.\n")
+    parser.add_argument('--rows', '-n', type=int, nargs='+', default=[10000], help="Number of recipes in each benchmarked dataset (e.g. 10000 100000 1000000).")
+    parser.add_argument('--stages', type=str, nargs='+', default=STAGES[1:], choices=STAGES[1:], help="Stages to run.")
+    parser.add_argument('--cleanrows', type=int, default=0, help="Most recipes to clean in the cleaning stage (0 for all of them).")
+    parser.add_argument('--workers', '-w', type=int, default=1, help="Number of processes to clean recipes with.")
+    parser.add_argument('--neighbours', type=int, default=50, help="Number of neighbours per recipe when building the index.")
+    parser.add_argument('--queries', '-q', type=int, default=1000, help="Number of recommendation queries to time.")
+    parser.add_argument('-k', type=int, default=10, help="Number of recommendations per query.")
+    parser.add_argument('--seed', '-s', type=int, default=0, help="Random seed for the datasets and queries.")
+    parser.add_argument('--workdir', type=str, default="benchData", help="Folder the synthetic datasets and indexes are kept in.")
+    parser.add_argument('--output', '-o', type=str, default="bench.json", help="File to write the results to.")
+    parser.add_argument('--compare', '-c', type=str, help="Earlier results file to compare against.")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    oldFile = os.path.abspath(args.compare) if args.compare else None
+
+    results = {"commit": commitID(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+               "cpus": os.cpu_count(), "seed": args.seed, "runs": {}}
+    useWorkDir(args.workdir)
+    for rows in args.rows:
+        results["runs"][str(rows)] = benchmark(rows, args)
+    results["peakRssMB"] = peakRSS()
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print("\nResults written to " + output)
+    for rows, stages in results["runs"].items():
+        for name, stage in stages.items():
+            print("  {:>8} {:<11} {:10.2f} s".format(rows, name, stage["seconds"]) +
+                  "".join("  {} {:.3g}".format(key, value) for key, value in stage.items()
+                          if key in ("rowsPerSec", "p50Ms", "p99Ms")))
+    if oldFile:
+        compare(oldFile, results)
+
+
+if __name__ == "__main__":
+    main()
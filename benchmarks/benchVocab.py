@@ -0,0 +1,63 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   benchVocab.py
+#   Purpose:    Microbenchmark comparing the cost of cleaning
+#               an ingredient line with the ingredient names
+#               kept in a list against the IngredientVocab, and
+#               the permutation search against n-gram matching.
+#
+########################################################
+
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cleanRecipeData
+from ingredientVocab import IngredientVocab
+
+
+def timeCleaning(recipes, ingredients, permutations, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for recipe in recipes:
+            cleanRecipeData.cleanRecipe(recipe, ingredients, permutations)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser("Time ingredient cleaning with list and set based vocabularies.\n")
+    parser.add_argument('--oldfile', '-f', type=str, required=True, help="File containing uncleaned recipe data.")
+    parser.add_argument('--column', '-c', type=str, required=True, help="Column name with ingredients.")
+    parser.add_argument('--sample', '-s', type=int, default=200, help="Number of recipes to clean.")
+    parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of times to repeat each measurement.")
+    args = parser.parse_args()
+
+    sheet = pd.read_csv(os.getcwd() + "\\Datasets\\" + args.oldfile, nrows=args.sample)
+    recipes = sheet[args.column].dropna().tolist()
+    lines = sum(len(cleanRecipeData.ast.literal_eval(recipe)) for recipe in recipes)
+
+    ingredients = cleanRecipeData.loadIngredients()
+    vocab = IngredientVocab(ingredients)
+
+    print("Cleaning", len(recipes), "recipes (" + str(lines) + " lines) against", len(vocab), "ingredients.")
+    for name, lookup, permutations in (("list", list(vocab), True),
+                                       ("IngredientVocab", vocab, True),
+                                       ("n-gram matcher", vocab, False)):
+        seconds = timeCleaning(recipes, lookup, permutations, args.repeat)
+        print("  {:<16} {:10.1f} us/line".format(name, 1e6 * seconds / lines))
+
+
+if __name__ == "__main__":
+    main()
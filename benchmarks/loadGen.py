@@ -0,0 +1,99 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   loadGen.py
+#   Purpose:    Sends requests to recipeServer.py at a fixed
+#               rate and reports the latencies it sees.
+#
+########################################################
+
+import time
+import json
+import argparse
+import threading
+import http.client
+import numpy as np
+from urllib.parse import urlsplit, urlencode
+
+
+def worker(url, paths, start, interval, offset, step, duration, latencies, errors):
+    """
+    Sends requests on one keep-alive connection. Requests are scheduled at fixed
+    times and latency is measured from when a request was due, so a slow server
+    is not hidden by requests waiting behind each other.
+    """
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+    i = offset
+    while True:
+        due = start + i * interval
+        if due - start >= duration:
+            break
+        wait = due - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            connection.request('GET', paths[i % len(paths)])
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append(None)
+            connection.close()
+            connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+        latencies.append(1000 * (time.perf_counter() - due))
+        i += step
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser("Send requests to recipeServer.py at a fixed rate.\n")
+    parser.add_argument('--url', type=str, default="http://127.0.0.1:8080", help="Address of the server.")
+    parser.add_argument('--queries', '-q', type=str, required=True, help="File with one recipe title (or ingredient list with --ingredients) per line.")
+    parser.add_argument('--ingredients', action='store_true', help="Queries are comma separated ingredient lists.")
+    parser.add_argument('--qps', type=float, default=200, help="Requests sent per second.")
+    parser.add_argument('--duration', '-d', type=float, default=10, help="Seconds to send requests for.")
+    parser.add_argument('--threads', type=int, default=16, help="Number of connections to send requests on.")
+    parser.add_argument('--neighbours', '-k', type=int, default=10, help="Number of recommendations per request.")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    with open(args.queries, encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()]
+    if args.ingredients:
+        paths = ["/similar_by_ingredients?" + urlencode({"ingredients": q, "k": args.neighbours}) for q in queries]
+    else:
+        paths = ["/similar?" + urlencode({"title": q, "k": args.neighbours}) for q in queries]
+
+    latencies = []
+    errors = []
+    start = time.perf_counter() + 0.1
+    threads = [threading.Thread(target=worker, args=(url, paths, start, 1 / args.qps, t, args.threads,
+                                                     args.duration, latencies, errors))
+               for t in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.asarray(latencies)
+    print("Sent", len(latencies), "requests in {:.1f} s ({:.0f} per second), {} errors.".format(
+        elapsed, len(latencies) / elapsed, len(errors)))
+    if len(latencies):
+        print("Latency (ms): p50 {:.2f}  p90 {:.2f}  p99 {:.2f}  max {:.2f}".format(
+            *np.percentile(latencies, [50, 90, 99]), latencies.max()))
+
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+    connection.request('GET', "/stats")
+    print("Server:", json.dumps(json.loads(connection.getresponse().read())))
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   synthCorpus.py
+#   Purpose:    Generates synthetic recipe datasets (an ingredient
+#               vocabulary, raw recipes and cleaned recipes) so
+#               the pipeline can be benchmarked without any of
+#               the downloaded datasets.
+#
+########################################################
+
+import os
+import csv
+import json
+import argparse
+import numpy as np
+
+#ingredient names every generated name is built from
+BASE_INGREDIENTS = [
+    "salt", "sugar", "butter", "flour", "egg", "eggs", "milk", "water", "olive oil", "garlic",
+    "onion", "onions", "black pepper", "vanilla", "baking powder", "baking soda", "brown sugar",
+    "cinnamon", "lemon juice", "vegetable oil", "cream cheese", "sour cream", "parmesan cheese",
+    "cheddar cheese", "mozzarella", "heavy cream", "chicken breast", "chicken broth", "ground beef",
+    "bacon", "pork chops", "sausage", "shrimp", "salmon", "tuna", "rice", "pasta", "spaghetti",
+    "noodles", "bread crumbs", "tomato", "tomatoes", "tomato sauce", "tomato paste", "potatoes",
+    "carrots", "celery", "green onions", "bell pepper", "jalapeno", "mushrooms", "spinach",
+    "broccoli", "zucchini", "corn", "peas", "green beans", "cabbage", "cucumber", "avocado",
+    "lettuce", "cilantro", "parsley", "basil", "oregano", "thyme", "rosemary", "dill", "mint",
+    "ginger", "cumin", "paprika", "chili powder", "cayenne", "nutmeg", "cloves", "bay leaf",
+    "soy sauce", "worcestershire sauce", "vinegar", "mustard", "mayonnaise", "ketchup", "honey",
+    "maple syrup", "molasses", "chocolate chips", "cocoa", "coconut", "almonds", "walnuts",
+    "pecans", "peanut butter", "raisins", "oats", "cornstarch", "yeast", "lime", "lemon",
+    "orange", "apple", "banana", "strawberries", "blueberries", "pineapple", "cranberries",
+    "beans", "black beans", "chickpeas", "lentils", "tofu", "yogurt", "buttermilk", "shortening",
+    "powdered sugar", "cream of mushroom soup", "salsa", "tortillas", "feta cheese", "ricotta",
+    "ham", "turkey", "lamb", "steak", "scallops", "crab", "wine", "beer", "broth", "capers",
+    "olives", "pickles", "sesame oil", "sesame seeds", "hot sauce", "barbecue sauce", "gelatin",
+]
+
+#words put in front of base ingredients to make more names, as in 'fresh basil'
+MODIFIERS = [
+    "fresh", "dried", "frozen", "canned", "red", "yellow", "sweet", "unsalted", "low fat",
+    "shredded", "grated", "light", "dark", "smoked", "organic", "toasted", "roasted", "boneless",
+]
+
+QUANTITIES = ["1", "2", "3", "4", "1/2", "1/4", "3/4", "1 1/2", "2 1/2", "1/3"]
+UNITS = ["cup", "cups", "tablespoon", "tablespoons", "teaspoon", "teaspoons", "tbsp", "tsp",
+         "lb", "oz", "pound", "grams", "ml", "quart", "pint"]
+SIZES = ["large", "small", "medium"]
+PREPARATIONS = ["chopped", "finely chopped", "sliced", "diced", "minced", "divided", "melted",
+                "softened", "peeled and diced", "at room temperature", "cut into pieces", "drained"]
+
+#ingredient line templates, similar to the lines found in scraped recipe datasets
+TEMPLATES = [
+    "{qty} {unit} {ing}",
+    "{qty} {unit} {ing}, {prep}",
+    "{qty} {size} {ing}, {prep}",
+    "{qty} ({qty2} oz) can {ing}",
+    "{ing} to taste",
+    "a pinch of {ing}",
+    "{qty} {unit} {ing} (about {qty2} {unit2})",
+    "{qty} {unit} {ing} plus more for serving",
+    "{qty} {unit} {ing}, {prep} [optional]",
+]
+
+TITLE_WORDS = ["Easy", "Quick", "Classic", "Grandma's", "Spicy", "Creamy", "Baked", "Grilled",
+               "Slow Cooker", "Homemade", "Healthy", "Best", "Simple", "Crispy", "Roasted"]
+DISHES = ["Soup", "Salad", "Casserole", "Pie", "Cake", "Cookies", "Bread", "Stew", "Curry",
+          "Tacos", "Pasta", "Stir Fry", "Muffins", "Dip", "Sandwich", "Bake", "Skillet", "Chili"]
+
+
+def makeVocabulary():
+    """
+    :return: List of every ingredient name, most commonly used first.
+    """
+    names = list(BASE_INGREDIENTS)
+    names.extend(modifier + " " + base for modifier in MODIFIERS for base in BASE_INGREDIENTS)
+    return names
+
+
+def ingredientWeights(numIngredients):
+    """
+    :return: Probability of picking each ingredient. A few ingredients (salt, sugar,
+             butter...) show up in most recipes and the rest rarely, like in real data.
+    """
+    weights = 1.0 / (np.arange(numIngredients) + 10)
+    return weights / weights.sum()
+
+
+def writeVocabulary(fileName, names, perRecipe=20):
+    """
+    Writes the vocabulary in the format of the Ingredients.json dataset, which is
+    one of the sources loadIngredients reads ingredient names from.
+    """
+    recipes = [{"id": i, "cuisine": "synthetic", "ingredients": names[start:start + perRecipe]}
+               for i, start in enumerate(range(0, len(names), perRecipe))]
+    with open(fileName, 'w', encoding='utf-8') as f:
+        json.dump(recipes, f)
+
+
+def ingredientLine(rng, name):
+    template = TEMPLATES[rng.integers(len(TEMPLATES))]
+    return template.format(qty=QUANTITIES[rng.integers(len(QUANTITIES))],
+                           qty2=QUANTITIES[rng.integers(len(QUANTITIES))],
+                           unit=UNITS[rng.integers(len(UNITS))],
+                           unit2=UNITS[rng.integers(len(UNITS))],
+                           size=SIZES[rng.integers(len(SIZES))],
+                           prep=PREPARATIONS[rng.integers(len(PREPARATIONS))],
+                           ing=name)
+
+
+def generateRecipes(rows, seed=0, chunkSize=10000):
+    """
+    Generates recipes a chunk at a time. The same rows and seed always give the
+    same recipes.
+
+    :param rows: Number of recipes to generate.
+    :param seed: Random seed.
+    :param chunkSize: Number of recipes generated at a time.
+    :return: Generator of (row, title, raw ingredient lines, ingredient names, link).
+    """
+    rng = np.random.default_rng(seed)
+    names = makeVocabulary()
+    weights = ingredientWeights(len(names))
+    for start in range(0, rows, chunkSize):
+        count = min(chunkSize, rows - start)
+        lengths = rng.integers(4, 16, size=count)
+        picks = rng.choice(len(names), size=int(lengths.sum()), p=weights)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        for i in range(count):
+            row = start + i
+            recipe = list(dict.fromkeys(names[j] for j in picks[offsets[i]:offsets[i + 1]]))
+            lines = [ingredientLine(rng, name) for name in recipe]
+            main = recipe[rng.integers(len(recipe))].title()
+            title = " ".join([TITLE_WORDS[rng.integers(len(TITLE_WORDS))], main,
+                              DISHES[rng.integers(len(DISHES))]])
+            yield row, title, lines, recipe, "www.example.com/recipe/" + str(row)
+
+
+def writeCorpus(rawFile, cleanedFile, rows, seed=0):
+    """
+    Writes matching raw and cleaned datasets. The raw dataset has the columns of the
+    RecipeNLG dataset that get cleaned (title, ingredients and link), and the cleaned
+    dataset has what cleanRecipeData.py writes: the ingredient names of each recipe.
+    """
+    with open(rawFile, 'w', newline='', encoding='utf-8') as raw, \
+         open(cleanedFile, 'w', newline='', encoding='utf-8') as cleaned:
+        rawWriter = csv.writer(raw)
+        cleanedWriter = csv.writer(cleaned)
+        rawWriter.writerow(['', 'title', 'ingredients', 'link'])
+        cleanedWriter.writerow(['index', 'title', 'ingredients', 'link'])
+        for row, title, lines, recipe, link in generateRecipes(rows, seed):
+            rawWriter.writerow([row, title, str(lines), link])
+            cleanedWriter.writerow([row, title, str(recipe), link])
+
+
+def corpusFiles(rows, seed=0):
+    """
+    :return: (vocabulary, raw, cleaned) file paths for a corpus, following the folder
+             layout the rest of the project reads datasets from.
+    """
+    name = "synthetic-" + str(rows) + "-" + str(seed) + ".csv"
+    return (os.getcwd() + "\\Datasets\\Ingredients.json",
+            os.getcwd() + "\\Datasets\\" + name,
+            os.getcwd() + "\\Cleaned_Datasets\\" + name)
+
+
+def useWorkDir(workDir):
+    """
+    Moves into the folder benchmark datasets are kept in, so the generated
+    vocabulary is never mixed with (or written over) real datasets.
+    """
+    os.makedirs(workDir, exist_ok=True)
+    os.chdir(workDir)
+
+
+def makeCorpus(rows, seed=0, overwrite=False):
+    """
+    Writes the vocabulary and a corpus of the given size, unless they already exist.
+
+    :return: (vocabulary, raw, cleaned) file paths.
+    """
+    vocabFile, rawFile, cleanedFile = corpusFiles(rows, seed)
+    for fileName in (vocabFile, cleanedFile):
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
+    if overwrite or not os.path.isfile(vocabFile):
+        writeVocabulary(vocabFile, makeVocabulary())
+    if overwrite or not (os.path.isfile(rawFile) and os.path.isfile(cleanedFile)):
+        writeCorpus(rawFile, cleanedFile, rows, seed)
+    return vocabFile, rawFile, cleanedFile
+
+
+def main():
+    parser = argparse.ArgumentParser("Generate synthetic raw and cleaned recipe datasets.\n")
+    parser.add_argument('--rows', '-n', type=int, nargs='+', default=[10000], help="Number of recipes in each dataset (e.g. 10000 100000 1000000).")
+    parser.add_argument('--seed', '-s', type=int, default=0, help="Random seed, so the same datasets can be generated again.")
+    parser.add_argument('--overwrite', '-o', action='store_true', help="Generate datasets again even if they exist.")
+    parser.add_argument('--workdir', type=str, default="benchData", help="Folder to write the datasets to.")
+    args = parser.parse_args()
+
+    useWorkDir(args.workdir)
+
+    for rows in args.rows:
+        print("Generating", rows, "recipes...", end='', flush=True)
+        vocabFile, rawFile, cleanedFile = makeCorpus(rows, args.seed, args.overwrite)
+        print("done.\n  " + rawFile + "\n  " + cleanedFile)
+    print("Vocabulary:", vocabFile)
+
+
+if __name__ == "__main__":
+    main()
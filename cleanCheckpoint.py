@@ -0,0 +1,96 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   cleanCheckpoint.py
+#   Purpose:    Keeps track of how much of a cleaning run has
+#               been written so an interrupted run can carry on
+#               from where it stopped.
+#
+########################################################
+
+import os
+import json
+
+
+def sourceStamp(fileName):
+    """
+    :return: Path, size and modification time of a file, used to check that a
+             resumed run is cleaning the same file.
+    """
+    stat = os.stat(fileName)
+    return [os.path.abspath(fileName), stat.st_size, stat.st_mtime]
+
+
+class Checkpoint:
+    """
+    Manifest of the batches of a cleaning run that have been committed to its
+    output file. A batch is committed once its rows have been flushed to disk,
+    and the manifest records the size of the output at that point, so anything
+    written after the last commit can be cut off when the run is resumed.
+    """
+
+    def __init__(self, outFile, source, options):
+        """
+        :param outFile: File the cleaned recipes are appended to.
+        :param source: sourceStamp of the file being cleaned.
+        :param options: Dictionary of the options that change the output.
+        """
+        self.outFile = outFile
+        self.fileName = outFile + ".checkpoint.json"
+        self.state = {"source": source, "options": options, "batches": 0, "written": 0, "bytes": 0}
+
+    @property
+    def batches(self):
+        return self.state["batches"]
+
+    @property
+    def written(self):
+        return self.state["written"]
+
+    def load(self):
+        """
+        Picks up the state of an earlier run of the same file with the same options.
+
+        :return: True if there is an earlier run to resume.
+        """
+        if not os.path.isfile(self.fileName) or not os.path.isfile(self.outFile):
+            return False
+        with open(self.fileName, 'r') as f:
+            state = json.load(f)
+        if state.get("source") != self.state["source"] or state.get("options") != self.state["options"]:
+            return False
+        if os.path.getsize(self.outFile) < state["bytes"]:
+            return False
+        self.state = state
+        return True
+
+    def open(self):
+        """
+        :return: Output file opened for appending, cut back to the last committed batch.
+        """
+        with open(self.outFile, 'ab') as f:
+            f.truncate(self.state["bytes"])
+        return open(self.outFile, 'a', newline='', encoding='utf-8')
+
+    def commit(self, out, batches, written):
+        """
+        :param out: Output file returned by open.
+        :param batches: Number of batches read from the source so far.
+        :param written: Number of recipes written so far.
+        """
+        out.flush()
+        os.fsync(out.fileno())
+        self.state.update({"batches": batches, "written": written, "bytes": out.tell()})
+        #replace the manifest in one step so it is never left half-written
+        with open(self.fileName + ".tmp", 'w') as f:
+            json.dump(self.state, f)
+        os.replace(self.fileName + ".tmp", self.fileName)
+
+    def finish(self):
+        if os.path.isfile(self.fileName):
+            os.remove(self.fileName)
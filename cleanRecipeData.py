@@ -15,13 +15,23 @@
 import pandas as pd
 import sys
 import os
-import shutil
 import argparse
 import re
 import numpy as np
 import ast
+import json
 import difflib
+import hashlib
 import itertools
+import collections
+import multiprocessing
+import instrument
+from ingredientVocab import IngredientVocab
+from recipeStream import iterRecipes, iterBatches
+from recipeColumnar import saveColumnar
+from lineCache import LineCache, lineKey, MISSING
+from cleanCheckpoint import Checkpoint, sourceStamp
+from recipeDedup import nearDuplicates
 
 #remove warnings about copying over dataframe
 
@@ -33,55 +43,107 @@ measurements = ["tbsp","tablespoon","tsp","teaspoon","oz","ounce",
                 "g","grams","kg","kilogram","l","liter"]
 
 # Words to avoid when looking at valid ingredient key words
-words_to_avoid = ["dry", "plus", "sliced", "more", "other", "sodium", 
-                  "garnish", "for", "mild", "large", "small", "medium",
-                  "cooked", "in", "square", "chopped", "ground", "whole",
-                  "temperature", "extra", ]
+words_to_avoid = frozenset(["dry", "plus", "sliced", "more", "other", "sodium", 
+                            "garnish", "for", "mild", "large", "small", "medium",
+                            "cooked", "in", "square", "chopped", "ground", "whole",
+                            "temperature", "extra", ])
 
 # Words to avoid when looking for valid ingredients (normally these
 # are words that cannot, alone, be considered an ingredient but are
 # important parts of whole ingredients. e.g. white pepper needs 'white'
 # but 'white' is not an ingredient in itself)
-ingredients_to_avoid = ["green", "white", "black"]
+ingredients_to_avoid = frozenset(["green", "white", "black"])
 
-approved_words = ["italian", "loaf"]
+approved_words = frozenset(["italian", "loaf"])
 
+#matches anything inside of brackets, e.g. '(about 2 cups)'
+brackets_pattern = re.compile(r"([\(\[]).*?([\)\]])")
+#matches runs of non alpha-numeric characters (other than the newlines between lines)
+non_word_pattern = re.compile(r"[^\w\n]+")
 
-def copyFile(args):
+#longest ingredient name (in words) looked for inside an ingredient line
+max_ingredient_words = 4
+
+
+def checkNewFile(args):
     """
     This function checks for valid command line arguments along with checking if the 
-    new file name exists and whether it can be properly copied.
+    new file name exists. Cleaned recipes are written straight into the new file, so
+    the old file is not copied first.
 
-    :return: Name of the file copied from the old file.
+    :return: Name of the new file.
     """
     fileName = args.newfile
-    if not (not fileName.endswith(".csv") or not fileName.endswith(".json")):
-        sys.exit("Make sure the file name contains its extension (csv or json).")
+    if not (fileName.endswith(".csv") or fileName.endswith(".npz")):
+        sys.exit("Make sure the file name contains its extension (csv or npz).")
     
     if args.overwriteFile:
-        #check if file exists in directory
-        if fileName in os.listdir(os.getcwd() + '\\Cleaned_Datasets'):
+        #check if file exists in directory (an unfinished run of it can still be resumed)
+        path = os.getcwd() + '\\Cleaned_Datasets\\' + fileName
+        if os.path.exists(path) and not os.path.isfile(outputFile(path) + ".checkpoint.json"):
             sys.exit("New file name must not exist to avoid overwriting data.\nDelete \""+
                         fileName+"\", enter a different name, " +
                         "\nor use the -o argument to ignore this check.")
-    
-    #create new file to put cleaned data into
-    try:
-        shutil.copyfile(os.getcwd() + '\\Datasets\\' + args.oldfile, 
-                        os.getcwd() + '\\Cleaned_Datasets\\' + fileName)
-    except shutil.SameFileError:
-        sys.exit("File already exists. Enter a different file name.")
-    except IsADirectoryError:
+    if os.path.isdir(os.getcwd() + '\\Cleaned_Datasets\\' + fileName):
         sys.exit("Entered file name is a directory. Make sure you only enter a valid file name.")
-    except PermissionError:
-        sys.exit("Permission to copy into new file denied. (File is most likely opened in another window.)")
-    except:
-        sys.exit("There was a problem copying data to new file. Make sure a only a valid file name is entered.")
     
     return fileName
 
 
-def loadIngredients():
+def outputFile(newFile):
+    """
+    :return: File cleaned recipes are appended to while cleaning. Columnar files are
+             only written once every recipe is cleaned, so they are built from a csv.
+    """
+    return newFile[:-len(".npz")] + ".partial.csv" if newFile.endswith(".npz") else newFile
+
+
+#datasets containing clean ingredient names, in the order they are loaded
+ingredient_sources = ["simplified-recipes-1M.npz", "full_dataset.csv", "Ingredients.json"]
+
+#compiled vocabulary saved after the sources are loaded the first time
+ingredient_cache = "ingredientVocab.cache.json"
+
+#cleaned ingredient of every raw line seen, shared by every cleaning run
+line_cache = "lineCache.npz"
+
+#number of committed batches between saves of the line cache
+line_cache_interval = 10
+
+#most cleaned lines kept in memory by default
+line_cache_size = 1000000
+
+
+def parseListColumn(column):
+    """
+    Parses a column of stringified lists (e.g. RecipeNLG's NER column) all at once
+    by joining them into a single json array, which is far faster than parsing
+    each row separately. Falls back to parsing row by row if any row is not
+    valid json.
+
+    :param column: List of strings that each contain a list.
+    :return: List of parsed lists.
+    """
+    try:
+        return json.loads('[' + ','.join(column) + ']')
+    except ValueError:
+        return [ast.literal_eval(row) for row in column]
+
+
+def sourceStamps(path):
+    """
+    :return: Dictionary of each ingredient source present mapped to its
+             modification time and size, used to check if the cache is stale.
+    """
+    stamps = {}
+    for name in ingredient_sources:
+        if os.path.isfile(path + name):
+            stat = os.stat(path + name)
+            stamps[name] = [stat.st_mtime, stat.st_size]
+    return stamps
+
+
+def loadIngredients(useCache=True):
     """
     Loads in cleaned ingredients from at least one of these datasets:
      - simplified-recipes-1M.npz
@@ -89,226 +151,536 @@ def loadIngredients():
      - Ingredients.json
     These datasets contain cleaned ingredients and can be obtained from
     the websites listed inside of the Datasets.txt file in the main project
-    directory.
+    directory. The combined list is cached in the Datasets folder and reused
+    until one of the datasets changes.
 
+    :param useCache: Read and write the compiled ingredient cache.
     :return: List of all ingredient names.
     """
     path = os.getcwd() + "\\Datasets\\"
+    stamps = sourceStamps(path)
+
+    if not stamps:
+        sys.exit("Invalid recipe dataset. Make sure file name is correct.")
+
+    if useCache and os.path.isfile(path + ingredient_cache):
+        with open(path + ingredient_cache, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get("sources") == stamps:
+            print("Loaded", len(cache["ingredients"]), "ingredients from cache.")
+            return cache["ingredients"]
+
     ingredients = []
-    openedFile = False
 
-    if os.path.isfile(path + "simplified-recipes-1M.npz"):
-        print("Loading ingredients...", end='')
+    if "simplified-recipes-1M.npz" in stamps:
+        print("Loading ingredients from simplified-recipes-1M.npz...", end='', flush=True)
         # load valid ingredients from simplified-recipes-1M, obtained from https://dominikschmidt.xyz/simplified-recipes-1M/
         with np.load(path+"simplified-recipes-1M.npz") as data:
-            ingredients = list(data['ingredients'])
+            ingredients.extend(data['ingredients'].tolist())
         print("done.")
-        openedFile = True
 
     #recipe dataset obtained from: https://recipenlg.cs.put.poznan.pl/dataset
-    if os.path.isfile(path +  "full_dataset.csv"):
-        print("Loading ingredients...", end='', flush=True)
-        recipes = pd.read_csv(path+"full_dataset.csv")
+    if "full_dataset.csv" in stamps:
+        print("Loading ingredients from full_dataset.csv...", end='', flush=True)
+        #only the NER column holds clean ingredient names
+        raw = pd.read_csv(path+"full_dataset.csv", usecols=['NER'])['NER'].dropna().tolist()
+        ingredients.extend(j for i in parseListColumn(raw) for j in i)
         print("done.")
-        print("Loading recipes...", flush=True)
-        raw = recipes['NER'].tolist()
+    
+    #recipe dataset obtained from: https://www.kaggle.com/datasets/kaggle/recipe-ingredients-dataset
+    if "Ingredients.json" in stamps:
+        print("Loading ingredients from Ingredients.json...", end='', flush=True)
+        with open(path+"Ingredients.json", 'r', encoding='utf-8') as f:
+            recipes = json.load(f)
+        ingredients.extend(j for i in recipes for j in i['ingredients'])
         print("done.")
 
-        print("Formatting ingredients...", flush=True)
+    print("  Making all ingredients lowercase and removing duplicates...", end='', flush=True)
+    ingredients = sorted({i.lower() for i in ingredients})
+    print("done.")
 
-        ingredients_raw = []
-        print("  Changing type to list...", end='', flush=True)
-        for row in raw:
-            ingredients_raw = ast.literal_eval(row)
-        print("done.")
-        
-        print("  Creating singular list...", end='', flush=True)
-        
-        ingredients.extend([j for i in ingredients_raw for j in i])
-        print("done.")
+    if useCache:
+        with open(path + ingredient_cache, 'w', encoding='utf-8') as f:
+            json.dump({"sources": stamps, "ingredients": ingredients}, f)
 
-        print("Completed.")
+    return ingredients
 
-        openedFile = True
-    
-    #recipe dataset obtained from: https://www.kaggle.com/datasets/kaggle/recipe-ingredients-dataset
-    if os.path.isfile(path + "Ingredients.json"):
-        print("Loading ingredients...", end='', flush=True)
-        sheet = pd.read_json(path+"Ingredients.json")
 
-        ingredients_raw = sheet['ingredients'].tolist()
-        print("done.")
-        
-        print("  Creating singular list...", end='', flush=True)
-        
-        ingredients.extend([j for i in ingredients_raw for j in i])
-        print("done.")        
+def cacheFingerprint(ingredients, permutations):
+    """
+    :param ingredients: IngredientVocab of valid ingredient names.
+    :param permutations: Whether ingredients are matched in any order.
+    :return: Hash of everything the cleaned ingredient of a line depends on.
+    """
+    fingerprint = hashlib.blake2b(digest_size=16)
+    for name in sorted(ingredients):
+        fingerprint.update(name.encode('utf-8') + b'\n')
+    fingerprint.update(repr((sorted(words_to_avoid), sorted(ingredients_to_avoid), sorted(approved_words),
+                             max_ingredient_words, permutations)).encode('utf-8'))
+    return fingerprint.hexdigest()
 
-        openedFile = True
-    
-    if not openedFile:
-        sys.exit("Invalid recipe dataset. Make sure file name is correct.")
 
-    print("  Making all ingredients lowercase...", end='', flush=True)
-    ingredients = [i.lower() for i in ingredients]
-    print("done.")
-    print("  Removing duplicates...", end='', flush=True)
-    ingredients = [*set(ingredients)]
-    print("done.")
+def iterJSONBatches(fileName, batchSize):
+    """
+    Streams recipes from the 1M dataset (link can be found in the Datasets.txt file
+    in the base project directory) a batch at a time, so memory use does not depend
+    on the size of the dataset.
 
-    return ingredients
+    :return: Generator of dataframes of raw recipes.
+    """
+    row = 0
+    for batch in iterBatches(iterRecipes(fileName), batchSize):
+        sheet = pd.DataFrame(batch)
+        #keep each recipe's position in the original file as its index
+        sheet.insert(0, 'index', range(row, row + len(sheet)))
+        row += len(sheet)
+        yield sheet
 
 
-def loadJSON(oldFile, args):
+def iterCSVBatches(fileName, batchSize):
     """
-    This function reads in raw recipes specifically from the 1M dataset (link can be
-    found in the Datasets.txt file in the base project directory) and formats them
-    to work with the cleaning algorithm. It creates a separate csv file with the
-    properly formatted recipes.
+    :return: Generator of dataframes of raw recipes read from a csv file.
+    """
+    for sheet in pd.read_csv(fileName, chunksize=batchSize):
+        if 'Unnamed: 0' in sheet.columns:
+            #correctly name index column
+            sheet.rename(columns = {'Unnamed: 0':'index'}, inplace = True)
+        #replace any empty cells with NaN
+        yield sheet.replace('', np.nan)
+
 
-    :param oldFile: The name of the 1M dataset json file.
+def cleanBatches(batches, newFile, ingredients, args, checkpoint, cache=None, cacheFile=None):
+    """
+    Cleans recipes a batch at a time, appending each cleaned batch to the new file.
+    Every batch is committed to a checkpoint once it is on disk, so a run that is
+    stopped part way through can be started again and carry on after the last
+    committed batch.
+
+    :param batches: Iterable of dataframes of raw recipes.
+    :param newFile: File to write the cleaned recipes into (.csv or .npz).
+    :param ingredients: IngredientVocab of valid ingredient names.
     :param args: Contains the command line arguments.
-    :return: Returns name of file .
+    :param checkpoint: Checkpoint of the output file, loaded if the run is being resumed.
+    :param cache: LineCache of lines already cleaned.
+    :param cacheFile: File the line cache is saved to as batches are committed.
     """
-    print("Loading recipes into program.", flush=True)
-    sheet = pd.read_json(oldFile)
-    print("Finished")
+    #titles already written, when removing duplicates
+    seenTitles = set()
+    written = checkpoint.written
+    if checkpoint.batches:
+        print("Resuming after", written, "cleaned recipes.")
 
-    row = 0
-    ingredients = []
-    print("Formatting recipes...", flush=True)
-    for recipe in sheet['ingredients']:
-        ing = []
-        for ingredient in recipe:
-            ing.append(ingredient['text'])
+    #one pool is shared by every batch instead of starting one per batch
+    pool = startPool(args.workers, ingredients, args.permutations) if args.workers > 1 else None
+
+    print("Cleaning recipes...", flush=True)
+    progress = instrument.Progress("Recipes cleaned")
+    progress.set(written)
+    with checkpoint.open() as out:
+        for batchNum, sheet in enumerate(batches):
+            if args.removeDup:
+                sheet = sheet.drop_duplicates(subset='title', keep='first')
+                sheet = sheet[~sheet['title'].isin(seenTitles)]
+                seenTitles.update(sheet['title'])
+            if batchNum < checkpoint.batches:
+                #already written by an earlier run (duplicates still need to be tracked)
+                continue
+
+            #drop all recipes without ingredients
+            sheet = sheet.dropna(subset=[args.column])
+            if len(sheet) > 0:
+                with instrument.stage("cleaning"):
+                    sheet = cleanIngredients(sheet, ingredients, args.column, args.workers, args.permutations,
+                                             pool=pool, cache=cache, progress=progress)
+                if args.removeDup:
+                    #number recipes consecutively once duplicates are gone
+                    sheet['index'] = np.arange(written, written + len(sheet))
+                with instrument.stage("writing"):
+                    sheet.to_csv(out, header=(out.tell() == 0), index=False)
+                written += len(sheet)
+                progress.set(written)
+
+            with instrument.stage("writing"):
+                checkpoint.commit(out, batchNum + 1, written)
+            if cacheFile is not None and (batchNum + 1) % line_cache_interval == 0:
+                with instrument.stage("lineCache"):
+                    cache.save(cacheFile)
+    progress.finish(newline=False)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if cacheFile is not None:
+        with instrument.stage("lineCache"):
+            cache.save(cacheFile)
+    if cache is not None:
+        print("\n" + cache.stats(), end='')
+        instrument.count('cacheHits', cache.hits)
+        instrument.count('cacheMisses', cache.misses)
+
+    if args.removeDup:
+        print("\nRemoving near duplicate recipes...", end='', flush=True)
+        with instrument.stage("dedup"):
+            removed = removeNearDuplicates(checkpoint.outFile, args.column, args.dupthreshold)
+        instrument.count('nearDuplicates', removed)
+        print("removed", removed, end='')
+
+    if newFile.endswith(".npz"):
+        print("\nWriting columnar file...", end='', flush=True)
+        with instrument.stage("columnar"):
+            sheet = pd.read_csv(checkpoint.outFile)
+            sheet[args.column] = parseListColumn(sheet[args.column].tolist())
+            saveColumnar(newFile, sheet, args.column)
+        os.remove(checkpoint.outFile)
+        print("done.", end='')
+    checkpoint.finish()
+    print("\nCompleted.")
+    return
+
+
+def removeNearDuplicates(fileName, column, threshold):
+    """
+    Keeps only the first recipe of every group of recipes with nearly the same
+    ingredients, and numbers the recipes that are left consecutively.
+
+    :param fileName: Cleaned csv file, rewritten in place.
+    :param column: Column name with cleaned ingredients.
+    :param threshold: Smallest share (0-1) of ingredients two recipes have in common to be near duplicates.
+    :return: Number of recipes removed.
+    """
+    sheet = pd.read_csv(fileName)
+    clusters = nearDuplicates(parseListColumn(sheet[column].tolist()), threshold)
+    keep = clusters == np.arange(len(sheet))
+    removed = len(sheet) - int(keep.sum())
+    if removed == 0:
+        return 0
+
+    sheet = sheet[keep]
+    if 'index' in sheet.columns:
+        sheet['index'] = np.arange(len(sheet))
+    #written beside the old file and swapped in, so it is never left half-written
+    #(a shorter file than the checkpoint recorded makes an interrupted run start over)
+    sheet.to_csv(fileName + ".tmp", index=False)
+    os.replace(fileName + ".tmp", fileName)
+    return removed
+
+
+def ngramMatch(subIng, ingredients):
+    """
+    Finds the longest valid ingredient made of consecutive words, in the order
+    they appear. Each starting word walks the vocabulary's word trie, so the
+    search is linear in the number of words. If several ingredients share the
+    longest length, the last one is used since the main ingredient of a line
+    usually comes last.
+
+    :subIng: List of words from an ingredient line.
+    :ingredients: IngredientVocab of valid ingredient names.
+    :return: Longest valid ingredient, or None if there is none.
+    """
+    best = None
+    bestLength = 0
+    for start in range(len(subIng)):
+        length = ingredients.longestMatch(subIng, start, max_ingredient_words)
+        if length == 0 or length < bestLength:
+            continue
+        match = ' '.join(subIng[start:start+length])
+        if match in ingredients_to_avoid:
+            continue
+        best = match
+        bestLength = length
+    return best
+
+
+def permutationMatch(subIng, ingredients):
+    """
+    Tests every permutation of up to four words, starting at the biggest, until a
+    valid ingredient is found. This also finds ingredients whose words are out of
+    order in the line, but its cost grows factorially with the number of words.
+
+    :subIng: List of words from an ingredient line.
+    :ingredients: IngredientVocab of valid ingredient names.
+    :return: First valid ingredient found, or None if there is none.
+    """
+    #get all possible permutations into a list
+    allComb = list()
+    tempComb = list()
+    for j in range(len(subIng)):
+        if j>=max_ingredient_words:
+            break
+        tempComb.append(itertools.permutations(subIng, j+1))
+    for j in range(len(tempComb)):
+        for perm in tempComb[j]:
+            allComb.append(list(perm))
+    
+    #for each permutation in reverse order (starting at biggest words)
+    for perm in reversed(allComb):
+        perm = ' '.join(perm)
+
+        if perm in ingredients_to_avoid:
+            continue
+        #if permutation is a valid ingredient, add it to ingredient list
+        if perm in ingredients:
+            return perm
+    return None
+
+
+def normalizeLines(lines):
+    """
+    Lowercases ingredient lines and strips them of non alpha-numeric characters
+    in a single pass over the whole batch, instead of running separate regular
+    expressions on every line.
+
+    :lines: List of uncleaned ingredient lines.
+    :return: List with the words of each line.
+    """
+    #lines are joined by newlines, so any inside of a line become spaces first
+    text = '\n'.join(line.replace('\n', ' ') for line in lines).lower()
+    #get rid of anything inside of brackets and then non alpha-numeric characters
+    text = brackets_pattern.sub('\\g<1>\\g<2>', text)
+    text = non_word_pattern.sub(' ', text)
+    return [line.split(' ') for line in text.split('\n')] if lines else []
+
+
+def cleanLine(words, ingredients, permutations=False, counts=None):
+    """
+    Cleans a single ingredient line down to the ingredient's name.
+
+    :words: Words of the normalized ingredient line.
+    :ingredients: IngredientVocab of valid ingredient names.
+    :permutations: Match ingredients whose words are in any order (slower).
+    :counts: Counter to count lines that were valid ingredients as is ('vocabHits')
+             and lines that had to be searched ('fallbacks') in.
+    :return: Cleaned ingredient, or None if it has no valid ingredient.
+    """
+    #keeps track of ingredients in recipe that exist in imported ingredients list
+    goodIngredients = []
+    
+    #loop over each ingredient
+    for word in words:
+        if len(word) < 3:
+            continue
+        if word in words_to_avoid or word in goodIngredients:
+            continue
+        if word in ingredients or word in approved_words:
+            #add it to goodIngredients if not in words_to_avoid or word in approved_words
+            goodIngredients.append(word)
+
+    #if there is no valid word, remove ingredient altogether
+    # (Attempting to fill ingredients not found in the imported ingredients list by
+    # cleaning out common words/numbers, e.g. 1/2 g kimchi, was not as effective as
+    # I would want so ingredients that are not found are deleted instead.)
+    if len(goodIngredients) == 0:
+        return None
+
+    #if there is at least one valid word, it is a valid ingredient
+    ingredient = ' '.join(goodIngredients)
         
-        sheet['ingredients'][row] = [*ing]
-        #sheet['ingredients'][row] = rIng
-        #print("sheet['ingredients'][row]: ", sheet['ingredients'][row])
+    #find the longest valid ingredient inside of the remaining words
+    if ingredient not in ingredients:
+        if counts is not None:
+            counts['fallbacks'] += 1
+        if permutations:
+            match = permutationMatch(goodIngredients, ingredients)
+        else:
+            match = ngramMatch(goodIngredients, ingredients)
+        if match is not None:
+            ingredient = match
+    elif counts is not None:
+        counts['vocabHits'] += 1
+    return ingredient
+
+
+def removeDuplicates(recipeIngredients):
+    """
+    Removes None values and repeated ingredients in linear time, keeping the last
+    time each ingredient appears.
 
-        print("\r", end='')
-        print("Current row:", row, "out of", len(sheet)-1, end='')
-        row += 1
-    print(" done.")
-    #print(sheet.info)
+    :recipeIngredients: List of cleaned ingredients.
+    :return: List of unique ingredients in their original order.
+    """
+    seen = set()
+    unique = []
+    for ingredient in reversed(recipeIngredients):
+        if ingredient is not None and ingredient not in seen:
+            seen.add(ingredient)
+            unique.append(ingredient)
+    unique.reverse()
+    return unique
+
+
+def parseRecipe(recipe):
+    """
+    :recipe: List of uncleaned ingredients, or a string containing the list.
+    :return: List of uncleaned ingredients.
+    """
+    if isinstance(recipe, str):
+        #convert list in a string type to list
+        return ast.literal_eval(recipe)
+    #recipes streamed from json are already lists
+    return recipe
 
-    #create temporary csv file that can be used for processing
-    oldFile = os.getcwd() + "\\Datasets\\temp.csv"
-    sheet.to_csv(oldFile)
-    return oldFile
+
+def cleanLines(lines, ingredients, permutations=False, counts=None):
+    """
+    Cleans a batch of ingredient lines, which are normalized together.
+
+    :lines: List of uncleaned ingredient lines.
+    :ingredients: IngredientVocab of valid ingredient names.
+    :permutations: Match ingredients whose words are in any order (slower).
+    :counts: Counter passed on to cleanLine.
+    :return: List with the cleaned ingredient (or None) of each line.
+    """
+    return [cleanLine(words, ingredients, permutations, counts) for words in normalizeLines(lines)]
 
 
-def cleanIngredients(sheet, ingredients, recipe_Col):
+def cleanRecipes(recipes, ingredients, permutations=False):
+    """
+    Cleans the ingredients of a batch of recipes, stripping each of them of
+    anything other than the ingredient name. Lines from every recipe in the batch
+    are normalized together.
+
+    :recipes: List of recipes, each a list of uncleaned ingredients or a string containing the list.
+    :ingredients: IngredientVocab of valid ingredient names.
+    :permutations: Match ingredients whose words are in any order (slower).
+    :return: List of cleaned ingredient lists, one per recipe.
+    """
+    parsed = [parseRecipe(recipe) for recipe in recipes]
+    lines = cleanLines([line for recipe in parsed for line in recipe], ingredients, permutations)
+
+    cleaned = []
+    pos = 0
+    for recipe in parsed:
+        cleaned.append(removeDuplicates(lines[pos:pos+len(recipe)]))
+        pos += len(recipe)
+    return cleaned
+
+
+def cleanRecipe(recipe, ingredients, permutations=False):
+    """
+    Cleans the ingredients of a single recipe.
+
+    :recipe: List of uncleaned ingredients, or a string containing the list.
+    :ingredients: IngredientVocab of valid ingredient names.
+    :permutations: Match ingredients whose words are in any order (slower).
+    :return: List of cleaned ingredients.
+    """
+    return cleanRecipes([recipe], ingredients, permutations)[0]
+
+
+#valid ingredient names shared with each worker process by initWorker
+workerIngredients = None
+workerPermutations = False
+
+
+def initWorker(ingredients, permutations):
+    """
+    Runs once in every worker process so the list of valid ingredients is only
+    sent to each worker once instead of with every chunk of recipes.
+    """
+    global workerIngredients, workerPermutations
+    workerIngredients = ingredients
+    workerPermutations = permutations
+
+
+def startPool(workers, ingredients, permutations):
+    """
+    :return: Process pool whose workers have been given the valid ingredients.
+    """
+    return multiprocessing.Pool(workers, initializer=initWorker, initargs=(ingredients, permutations))
+
+
+def cleanChunk(lines):
+    """
+    Cleans a chunk of ingredient lines inside of a worker process.
+
+    :lines: List of uncleaned ingredient lines.
+    :return: (cleaned, counts) with the cleaned ingredients in the same order and the
+             worker's cleanLine counts, which are added to the main process's counters.
+    """
+    counts = collections.Counter()
+    return cleanLines(lines, workerIngredients, workerPermutations, counts), counts
+
+
+def cleanIngredients(sheet, ingredients, recipe_Col, workers=1, permutations=False, chunkSize=10000, pool=None, cache=None, progress=None):
     """
     Algorithm for cleaning ingredients. It takes in a sheet and a specified
-    column name and strips it of anything other than ingredient names.
+    column name and strips it of anything other than ingredient names. Each
+    distinct ingredient line is only cleaned once, and lines already in the
+    cache are not cleaned at all.
 
     :sheet: Dataframe to clean.
-    :ingredients: List of valid ingredient names.
+    :ingredients: IngredientVocab of valid ingredient names.
     :recipe_Col: Column containing the recipe ingredients that need to be cleaned.
+    :workers: Number of processes to clean recipes with.
+    :permutations: Match ingredients whose words are in any order (slower).
+    :chunkSize: Number of lines cleaned (or sent to a worker process) at a time.
+    :pool: Already running pool from startPool to use instead of starting a new one.
+    :cache: LineCache to look lines up in and add newly cleaned lines to.
+    :progress: Progress the caller is already showing (e.g. one per dataset instead of per
+               sheet). If it is not given, progress through the sheet's new lines is shown.
     :return: Sheet with cleaned ingredients in specified column instead of uncleaned ones.
     """
-    #loop through each row
-    for index, row in sheet.iterrows():
-        print("\r", end='')
-        print("Current row:", index, "out of", len(sheet[recipe_Col]), end='')
-        #loop over each column
-        for col in sheet.columns:
-            if col == recipe_Col:
-                #make all ingredients lowercase
-                sheet[col][index] = sheet[col][index].lower()
-                
-                #convert list in a string type to list
-                recipeIngredients = ast.literal_eval(sheet[col][index])
-
-                #loop through each list ingredient and extract useful/valid information
-                for i in range(len(recipeIngredients)):
-                    #get rid of non alpha-numeric characters
-                    recipeIngredients[i] = re.sub("([\(\[]).*?([\)\]])", "\g<1>\g<2>", recipeIngredients[i])
-                    recipeIngredients[i] = re.sub(r'\W+', ' ', recipeIngredients[i])
-                    
-                    #keeps track of ingredients in recipe that exist in imported ingredients list
-                    goodIngredients = []
-                    
-                    words = recipeIngredients[i].split(' ')
-                    #loop over each ingredient
-                    for word in words:
-                        if len(word) < 3:
-                            continue
-                        if word in words_to_avoid or word in goodIngredients:
-                            continue
-                        if word in ingredients or word in approved_words:
-                            #add it to goodIngredients if not in words_to_avoid or word in approved_words
-                            goodIngredients.append(word)
-
-                    #if there is at least one valid word, it is a valid ingredient so add it to
-                    #the current recipe ingredients list
-                    if len(goodIngredients) != 0:
-                        recipeIngredients[i] = ' '.join(goodIngredients)
-                    else:
-                        # Commented code is for attempting to fill ingredients not found in the
-                        # imported ingredients list. e.g. 1/2 g kimchi might not be found as
-                        # a valid ingredient, but this code would attempt to clean all common
-                        # words/numbers that are not part of the ingredient name. I found it 
-                        # not as effective as I would want so I am commenting it out and instead
-                        # just deleting ingredients that are not found.
-                            #print("words: ", words)
-                            #
-                            #words = [word for word in words if not word.isnumeric()]
-                            #print("removing ingredient: ", words)
-                            #for word in measurements:
-                            #    if word in words:
-                            #        print("found word in words: ", word)
-                            #        words.remove(word)
-                            #recipeIngredients[i] = ' '.join(words)
-
-                        #if there is no valid word, remove ingredient altogether
-                        recipeIngredients[i] = None
-                        continue
-                        
-                    #split into individual words and test every permutation until a valid ingredient is found
-                    if recipeIngredients[i] not in ingredients:
-                        subIng = recipeIngredients[i].split(' ')
-                        
-                        #get all possible permutations into a list
-                        allComb = list()
-                        tempComb = list()
-                        for j in range(len(subIng)):
-                            if j>3:
-                                break
-                            tempComb.append(itertools.permutations(subIng, j+1))
-                        for j in range(len(tempComb)):
-                            for perm in tempComb[j]:
-                                allComb.append(list(perm))
-                        
-                        #for each permutation in reverse order (starting at biggest words)
-                        for perm in reversed(allComb):
-                            #if no valid permutations, don't add any ingredient
-                            if not perm:
-                                recipeIngredients.remove(recipeIngredients[i])
-                                i-=1
-                                continue
-                            
-                            perm = ' '.join(perm)
-
-                            if perm in ingredients_to_avoid:
-                                continue
-                            #if permutation is a valid ingredient, add it to ingredient list
-                            if perm in ingredients:
-                                recipeIngredients[i] = perm
-                                break
-                lengthRI=len(recipeIngredients)
-                j=0
-                #remove any None values in recipe ingredients
-                while j < lengthRI:
-                    if recipeIngredients[j] == None or recipeIngredients.count(recipeIngredients[j]) > 1:
-                        recipeIngredients.remove(recipeIngredients[j])
-                        j-=1
-                        lengthRI-=1
-                    j+=1
-                
-                #add cleaned ingredients over previous ones
-                sheet[col][index] = recipeIngredients
+    recipes = [parseRecipe(recipe) for recipe in sheet[recipe_Col]]
+    if cache is None:
+        cache = LineCache(None)
+    keys = [[lineKey(line) for line in recipe] for recipe in recipes]
+
+    #cleaned ingredient of each line in this sheet, kept apart from the cache so
+    #lines evicted from it part way through the sheet are still found
+    resolved = {}
+    #lines that have not been cleaned before, once each
+    missing = {}
+    for recipe, recipeKeys in zip(recipes, keys):
+        for line, key in zip(recipe, recipeKeys):
+            if key in resolved or key in missing:
+                #repeated inside of this sheet, so it is only cleaned once
+                cache.hits += 1
+                continue
+            ingredient = cache.get(key)
+            if ingredient is MISSING:
+                missing[key] = line
+            else:
+                resolved[key] = ingredient
+    lines = list(missing.values())
+    chunks = [lines[i:i+chunkSize] for i in range(0, len(lines), chunkSize)]
+    cleaned = []
+    lineProgress = instrument.Progress("New lines", len(lines)) if progress is None else None
+
+    if pool is not None or workers > 1:
+        ownPool = pool is None
+        if ownPool:
+            pool = startPool(workers, ingredients, permutations)
+        try:
+            #imap hands back chunks in the order they were sent
+            for chunk, counts in pool.imap(cleanChunk, chunks):
+                cleaned.extend(chunk)
+                instrument.counters.update(counts)
+                if lineProgress is not None:
+                    lineProgress.set(len(cleaned))
+        finally:
+            if ownPool:
+                pool.close()
+                pool.join()
+    else:
+        #loop through each chunk of lines
+        for chunk in chunks:
+            cleaned.extend(cleanLines(chunk, ingredients, permutations, instrument.counters))
+            if lineProgress is not None:
+                lineProgress.set(len(cleaned))
+    if lineProgress is not None:
+        lineProgress.finish(newline=False)
+
+    for key, ingredient in zip(missing, cleaned):
+        resolved[key] = ingredient
+        cache[key] = ingredient
+
+    #add cleaned ingredients over previous ones
+    cleaned = [removeDuplicates([resolved[key] for key in recipeKeys]) for recipeKeys in keys]
+    instrument.count('rowsCleaned', len(recipes))
+    instrument.count('linesRead', sum(len(recipe) for recipe in recipes))
+    instrument.count('linesCleaned', len(lines))
+    instrument.count('linesDropped', sum(resolved[key] is None for recipeKeys in keys for key in recipeKeys))
+    sheet[recipe_Col] = pd.Series(cleaned, index=sheet.index, dtype=object)
     return sheet
 
 
@@ -317,66 +689,62 @@ def main():
     parser = argparse.ArgumentParser("Copy recipe data set, clean it, and output in a new file.\n")
     parser.add_argument('--oldfile', '-f', type=str, required=True, help="File containing uncleaned recipe data.")
     parser.add_argument('--column', '-c', type=str, required=True, help="Column name with ingredients.")
-    parser.add_argument('--newfile', '-n', type=str, required=True, help="New file to copy cleaned data into.")
+    parser.add_argument('--newfile', '-n', type=str, required=True, help="New file to copy cleaned data into (.csv, or .npz for the compact columnar format).")
     parser.add_argument('--overwriteFile', '-o', action='store_false', help="Give warning about overwriting a pre-existing file.")
-    parser.add_argument('--removeDup', '-d', action='store_true', help="Remove duplicate recipe names.")
+    parser.add_argument('--removeDup', '-d', action='store_true', help="Remove recipes with duplicate names, and recipes with nearly the same ingredients as an earlier recipe.")
+    parser.add_argument('--dupthreshold', type=float, default=0.8, help="Smallest share (0-1) of ingredients two recipes must have in common to be removed as near duplicates by --removeDup.")
+    parser.add_argument('--workers', '-w', type=int, default=1, help="Number of processes to clean recipes with.")
+    parser.add_argument('--permutations', '-p', action='store_true', help="Match ingredient words in any order like previous versions (much slower).")
+    parser.add_argument('--batchsize', '-b', type=int, default=10000, help="Number of recipes cleaned and committed to the new file at a time.")
+    parser.add_argument('--restart', '-r', action='store_true', help="Clean from the beginning instead of resuming an unfinished run.")
+    parser.add_argument('--nocache', action='store_true', help="Do not read or update the cache of cleaned ingredient lines.")
+    parser.add_argument('--cachefile', type=str, default=line_cache, help="File in the Datasets folder to load cleaned lines from and save them to.")
+    parser.add_argument('--cachesize', type=int, default=line_cache_size, help="Most cleaned lines to keep in the cache (0 for no limit).")
+    instrument.addArguments(parser)
     args = parser.parse_args()
+    instrument.start(args, "cleanRecipeData")
+
+    if not 0 < args.dupthreshold <= 1:
+        sys.exit("--dupthreshold must be more than 0 and at most 1.")
 
     #read CLA for uncleaned data file and new data file name
     oldFile = os.getcwd() + "\\Datasets\\" + args.oldfile
-    newFile = os.getcwd() + "\\Cleaned_Datasets\\" + copyFile(args)
-
-    #get a copy of the sheet from the old file
-    if oldFile.endswith(".csv"):
-        sheet = pd.read_csv(oldFile)
-    #1M dataset cleaning if import dataset
+    newFile = os.getcwd() + "\\Cleaned_Datasets\\" + checkNewFile(args)
+    if not (oldFile.endswith(".csv") or oldFile.endswith(".json")):
+        exit("Invalid file type. Compatible file types include: '.csv' '.json'")
+    if not os.path.isfile(oldFile):
+        sys.exit("\"" + args.oldfile + "\" was not found in the Datasets folder.")
+
+    #index valid ingredients once for constant time lookups while cleaning
+    with instrument.stage("vocabulary"):
+        ingredients = IngredientVocab(loadIngredients())
+    fingerprint = cacheFingerprint(ingredients, args.permutations)
+
+    #lines cleaned by earlier runs (of any dataset) are looked up instead of cleaned again
+    cache = LineCache(fingerprint, args.cachesize)
+    cacheFile = None
+    if not args.nocache:
+        cacheFile = os.getcwd() + "\\Datasets\\" + args.cachefile
+        with instrument.stage("lineCache"):
+            cache = LineCache.load(cacheFile, fingerprint, args.cachesize)
+        if len(cache):
+            print("Loaded", len(cache), "cleaned lines from cache.")
+
+    #anything that changes the output has to match for a run to be resumed
+    options = {"column": args.column, "removeDup": args.removeDup, "dupThreshold": args.dupthreshold, "batchSize": args.batchsize,
+               "newfile": args.newfile, "fingerprint": fingerprint}
+    checkpoint = Checkpoint(outputFile(newFile), sourceStamp(oldFile), options)
+    if not args.restart and checkpoint.load():
+        print("Found an unfinished run of " + args.newfile + ".")
+
+    #recipes are read, cleaned and written a batch at a time
     if oldFile.endswith(".json"):
-        oldFile = loadJSON(oldFile, args)
-        sheet = pd.read_csv(oldFile)
-    
-    if args.removeDup:
-        try:
-            sheet = sheet.drop_duplicates(subset='title', keep='first')
-        except:
-            exit("Invalid file type. Compatible file types include: '.csv' '.json'")
-
-    ingredients = loadIngredients()
-
-    #replace any empty cells with NaN
-    sheet = sheet.replace('', np.nan)
-
-    #drop all recipes with NaN value for Title or Ingredients
-    sheet = sheet.dropna(subset=[args.column])
-    
-    print("Cleaning recipes...", flush=True)
-    #clean recipes into useful format (only ingredient names)
-    sheet = cleanIngredients(sheet, ingredients, args.column)
-    print("\nCompleted.")
-
-    if 'Unnamed: 0' in sheet.columns:
-        #correctly name index column
-        sheet.rename(columns = {'Unnamed: 0':'index'}, inplace = True)
-    
-    if args.removeDup:
-        print("Adjusting rows for removed duplicates...", flush=True)
-        j = 0
-        for i, row in sheet.iterrows():
-            sheet.at[i, 'index'] = j
-            j += 1
-            print('\r', end='')
-            print("Row:", i, end='')
-        print("\nCompleted.")
-
-    print("Copying to file " + args.newfile + "...", flush=True)
-    #copy sheet into a new file
-    sheet.to_csv(newFile, index=False)
-    print("Completed.")
-    
-    #if temp csv file was created with 1M dataset, delete it after done processing
-    if (args.oldfile).endswith(".json"):
-        os.remove(oldFile)
+        batches = iterJSONBatches(oldFile, args.batchsize)
+    else:
+        batches = iterCSVBatches(oldFile, args.batchsize)
+    cleanBatches(batches, newFile, ingredients, args, checkpoint, cache, cacheFile)
     
     return
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -13,70 +13,182 @@
 ########################################################
 
 import pandas as pd
-import difflib
+import numpy as np
 import os
+import sys
 import ast
 import random
 import argparse
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import instrument
+from recipeFeatures import fitFeatures, columnarFeatures, addFeatureArguments, featureOptions, usesTitles
+from recipeSimilarity import SimilarityEngine
+from recipeIndex import saveIndex, loadIndex, appendRecipes, removeRecipes, compactIndex
+from recipeStore import RecipeStore
+from recipeColumnar import ColumnarRecipes, loadColumnar
+from pantrySearch import PantrySearch, splitIngredients
+from annIndex import RandomProjectionIndex, recallAtK
+from imageEmbeddings import loadEmbeddings, VisualSimilarity, blendScores
 
 pd.options.mode.chained_assignment = None
 
+#number of recipes fetched per query when using approximate search
+ANN_RESULTS = 100
+
+#number of random recipes approximate search is checked against exact search on
+ANN_CHECK_SAMPLES = 50
+#largest share of the recipes approximate search may compare per query before exact
+#search is used instead
+ANN_MAX_SHORTLIST = 0.25
+
+#number of recipes fetched per pantry search
+PANTRY_RESULTS = 100
+
+#number of titles listed when a recipe name ends with *
+TITLE_COMPLETIONS = 10
+
 def checkCLA():
     #CLA argument definitions
     parser = argparse.ArgumentParser("Copy recipe data set, clean it, and output in a new file.\n")
-    parser.add_argument('--datafile', '-f', type=str, required=True, help="File containing cleaned recipe data.")
-    parser.add_argument('--usetitle', '-t', action='store_true', help="Take into consideration the name of a recipe for recommendations.")
+    parser.add_argument('--datafile', '-f', type=str, help="File containing cleaned recipe data.")
+    addFeatureArguments(parser)
+    parser.add_argument('--buildindex', '-b', type=str, help="Build a recommender index with this name and exit.")
+    parser.add_argument('--index', '-i', type=str, help="Load a prebuilt recommender index instead of refitting the data.")
+    parser.add_argument('--neighbours', '-k', type=int, default=50, help="Number of neighbours to precompute per recipe when building an index.")
+    parser.add_argument('--ann', '-a', action='store_true', help="Use approximate nearest neighbour search instead of exact search.")
+    parser.add_argument('--anntables', type=int, default=16, help="Number of hash tables used by approximate search.")
+    parser.add_argument('--annbits', type=int, default=12, help="Number of hash bits per table used by approximate search.")
+    parser.add_argument('--annrecall', type=int, default=0, help="Report recall@10 of approximate search on this many random recipes and exit.")
+    parser.add_argument('--append', type=str, help="Add the recipes in this cleaned data file to the --index and exit.")
+    parser.add_argument('--remove', type=str, help="Remove the recipes whose titles are listed (one per line) in this file from the --index and exit.")
+    parser.add_argument('--compact', action='store_true', help="Rebuild the --index without its removed recipes and exit.")
+    parser.add_argument('--images', type=str, help="Image embeddings (built by imageEmbeddings.py) in the Indexes folder to blend visual similarity in from.")
+    parser.add_argument('--visual', type=float, default=0.3, help="How much (0-1) visual similarity counts when --images are given.")
+    instrument.addArguments(parser)
     args = parser.parse_args()
+    instrument.start(args, "cosFoodRec")
+
+    if (args.append or args.remove or args.compact) and not args.index:
+        parser.error("--append, --remove and --compact need an --index to update.")
+    if not 0 <= args.visual <= 1:
+        parser.error("--visual must be between 0 and 1.")
+    if args.index:
+        #everything needed is inside the index
+        return None, args
+    if not args.datafile:
+        parser.error("--datafile is required unless an --index is given.")
 
     print("Loading data...", end='', flush=True)
     # import recipe data
-    recipeSheet = pd.read_csv(os.getcwd() + '\\Cleaned_Datasets\\' + args.datafile)
+    with instrument.stage("load"):
+        recipeSheet = readCleaned(args.datafile)
 
-    if len(recipeSheet) > 50000:
-        exit("\nFile size limited to 50,000 rows to prevent high memory usage.")
-    
     return recipeSheet, args
 
-def getRecipes(args, recipeSheet):
-    recipes = recipeSheet['ingredients']
+def readCleaned(fileName):
+    if fileName.endswith(".npz"):
+        #columnar datasets hold ingredient ids, so nothing needs parsing
+        return loadColumnar(os.getcwd() + '\\Cleaned_Datasets\\' + fileName)
+    return pd.read_csv(os.getcwd() + '\\Cleaned_Datasets\\' + fileName)
 
-    print("done.\nGetting feature vector...", end='', flush=True)
+def getStore(recipeSheet):
+    #parse the recipe information shown to the user once
+    if isinstance(recipeSheet, ColumnarRecipes):
+        return RecipeStore.fromColumnar(recipeSheet)
+    return RecipeStore.fromSheet(recipeSheet)
 
-    #convert recipe strings into lists
-    recipes = [ast.literal_eval(recipe) for recipe in recipes]
-    recipes = list(map(sorted, recipes))
-    #convert recipe lists into simplified string
-    recipes = [' '.join(recipe) for recipe in recipes]
-    
-    #If titles are used in feature vector, the similarity will be more biased towards
-    #similarly named recipes. I have added in a flag to use them as it can be useful
-    #for getting similar recipes.
+def getRecipes(args, recipeSheet):
+    """
+    :return: (featureVector, terms, idf)
+    """
+    print("done.\nGetting feature vector...", end='', flush=True)
+    options = featureOptions(args)
 
-    if args.usetitle:
-        titles = recipeSheet['title']
-        titles[:] = [' ' + s for s in recipeSheet['title']]
-        recipes = recipes + titles
+    if isinstance(recipeSheet, ColumnarRecipes):
+        features = columnarFeatures(recipeSheet, options)
+    else:
+        #convert recipe strings into lists
+        recipes = [ast.literal_eval(recipe) for recipe in recipeSheet['ingredients']]
+        titles = [str(title) for title in recipeSheet['title']]
 
-    #convert recipes into feature vectors
-    vectorizer = TfidfVectorizer()
-    featureVector = vectorizer.fit_transform(recipes)
+        #If titles are used in feature vector, the similarity will be more biased towards
+        #similarly named recipes. I have added in a flag to use them as it can be useful
+        #for getting similar recipes. They are weighted separately from the ingredients
+        #with --titleweight.
+        features = fitFeatures(recipes, titles if usesTitles(options) else None, options)
 
-    print("done.\nGetting cosing similarity...", end='', flush=True)
+    print("done.\nPreparing similarity engine...", end='', flush=True)
 
     if args.usetitle:
         print("\nUsing titles.")
-        titles[:] = [s[1:] for s in recipeSheet['title']]
     
-    return recipes, featureVector
+    return features
+
+def buildIndex(args, store, featureVector, terms, idf):
+    indexDir = os.getcwd() + '\\Indexes\\' + args.buildindex
+
+    print("Finding", args.neighbours, "neighbours per recipe...", end='', flush=True)
+    neighbourIdx, neighbourSim = SimilarityEngine(featureVector).neighbours(args.neighbours)
+    print("done.\nSaving index to " + indexDir + "...", end='', flush=True)
+    saveIndex(indexDir, terms, idf, featureVector,
+              neighbourIdx, neighbourSim, store,
+              meta={"datafile": args.datafile, "usetitle": args.usetitle,
+                    "features": featureOptions(args)})
+    print("done.")
+    return
+
+def loadEngine(args):
+    """
+    Loads the recipes and similarity engine for tools that answer queries without
+    any prompts, from an --index if one is given or else by fitting the --datafile.
 
-def getRecipeID(recipeSheet):
+    :return: (store, engine, terms, idf)
+    """
+    if args.index:
+        index = loadIndex(os.getcwd() + '\\Indexes\\' + args.index)
+        engine = SimilarityEngine.fromIndex(index)
+        return RecipeStore.fromIndex(index), engine, index.terms, index.idf
+    recipeSheet = readCleaned(args.datafile)
+    featureVector, terms, idf = getRecipes(args, recipeSheet)
+    return getStore(recipeSheet), SimilarityEngine(featureVector), terms, idf
+
+def updateIndex(args):
+    indexDir = os.getcwd() + '\\Indexes\\' + args.index
+
+    if args.append:
+        print("Adding recipes from " + args.append + "...", end='', flush=True)
+        store = getStore(readCleaned(args.append))
+        appendRecipes(indexDir, store)
+        print("done.\nAdded", len(store), "recipes.")
+    if args.remove:
+        with open(args.remove, encoding='utf-8') as f:
+            titles = [line.strip() for line in f if line.strip()]
+        index = loadIndex(indexDir)
+        rows = [index.findTitle(title) for title in titles]
+        for title, row in zip(titles, rows):
+            if row < 0:
+                print("No recipe titled \"" + title + "\" in the index.")
+        #no index may be loaded while the directory is replaced (its files are memory-mapped)
+        del index
+        print("Removing recipes...", end='', flush=True)
+        numRemoved = removeRecipes(indexDir, [row for row in rows if row >= 0]).numRemoved
+        print("done.\n" + str(numRemoved), "removed recipes waiting for compaction.")
+    if args.compact:
+        print("Compacting index...", end='', flush=True)
+        numRecipes = len(compactIndex(indexDir))
+        print("done.\nIndex holds", numRecipes, "recipes.")
+    return
+
+def getRecipeID(store):
     #get valid recipe
     while True:
-        recipeName = input("Enter recipe: ")
-        if recipeName not in recipeSheet['title'].tolist():
-            recipeName = difflib.get_close_matches(recipeName, recipeSheet['title'].tolist(), cutoff=0.5)
+        recipeName = input("Enter recipe (or the start of one followed by *): ")
+        if recipeName.endswith('*'):
+            #list titles starting with what was typed
+            matches = store.titleIndex().complete(recipeName[:-1].strip(), TITLE_COMPLETIONS)
+            print("\n".join(matches) if matches else "No recipes start with \"" + recipeName[:-1].strip() + "\".")
+            continue
+        if recipeName not in store:
+            recipeName = store.titleIndex().closeMatches(recipeName, 3, cutoff=0.5)
             num = 0
             try:
                 num = int(input("No direct match found. Enter the corresponding"+
@@ -104,24 +216,34 @@ def getRecipeID(recipeSheet):
         else:
             break
     #get the index of selected recipe
-    recipeIdx = recipeSheet[recipeSheet['title'] == recipeName]['index'].values[0]
+    recipeIdx = store.findTitle(recipeName)
 
     return recipeIdx, recipeName
 
-def printRecipes(recipeSheet, sortedSim):
+def getPantryQuery():
+    #get the ingredients on hand along with any that must or must not be used
+    while True:
+        ingredients = splitIngredients(input("Enter ingredients (comma separated): "))
+        include = splitIngredients(input("Ingredients recipes must have (optional): "))
+        exclude = splitIngredients(input("Ingredients recipes must not have (optional): "))
+        if ingredients or include:
+            return ingredients, include, exclude
+        print("Please enter at least one ingredient.")
+
+def printRecipes(store, sortedSim, skipFirst=True):
     print("\nRecommended recipes")
     print("----------------------------------------")
-    i = 0
+    #the first result of a recipe search is normally the recipe itself
+    i = 0 if skipFirst else -1
     j = 1
     #print out similar values starting from most similar
     while True:
         i += random.randint(1, 3) #add a little bit of randomness to recommended recipes
         try:
-            print((recipeSheet[recipeSheet['index'] == sortedSim[i][0]].values[0])[4]) #title
-            print((recipeSheet[recipeSheet['index'] == sortedSim[i][0]].values[0])[2]) #link
-
-            ingredients = ast.literal_eval((recipeSheet[recipeSheet['index'] == sortedSim[i][0]].values[0])[1])
-            print("Ingredients:", ", ".join(ingredients)) #ingredients
+            recipe = store[sortedSim[i][0]]
+            print(recipe.title)
+            print(recipe.link)
+            print("Ingredients:", ", ".join(recipe.ingredients))
         except:
             #error printing, error in cleaned data, or reached end of sortedSim
             print("Error retrieving recipe information. Please enter a different recipe or select a different dataset.")
@@ -141,43 +263,118 @@ def main():
     #check CLA and open cleaned recipes file
     recipeSheet, args = checkCLA()
 
-    #get recipes from file and a feature vector
-    recipes, featureVector = getRecipes(args, recipeSheet)
+    if args.append or args.remove or args.compact:
+        with instrument.stage("update"):
+            updateIndex(args)
+        return
+
+    if args.index:
+        #memory-map a prebuilt index instead of refitting the feature vectors
+        print("Loading index...", end='', flush=True)
+        with instrument.stage("load"):
+            index = loadIndex(os.getcwd() + '\\Indexes\\' + args.index)
+            store = RecipeStore.fromIndex(index)
+            terms, idf = index.terms, index.idf
+            #recipes removed from the index are never recommended
+            engine = SimilarityEngine.fromIndex(index)
+    else:
+        with instrument.stage("features"):
+            store = getStore(recipeSheet)
 
-    #get cosine similarity between recipes
-    cosSim = cosine_similarity(featureVector)
+            #get recipes from file and a feature vector
+            featureVector, terms, idf = getRecipes(args, recipeSheet)
+
+        if args.buildindex:
+            with instrument.stage("index"):
+                buildIndex(args, store, featureVector, terms, idf)
+            return
+
+        #cosine similarity is computed per query against the sparse feature vectors
+        engine = SimilarityEngine(featureVector)
+
+    ann = None
+    if args.ann or args.annrecall:
+        print("done.\nHashing recipes for approximate search...", end='', flush=True)
+        with instrument.stage("ann"):
+            ann = RandomProjectionIndex(engine.features, args.anntables, args.annbits)
+        #approximate search is only worth it where it is faster than exact search, so
+        #its recall and speed are always reported
+        samples = args.annrecall or ANN_CHECK_SAMPLES
+        print("done.\nComparing with exact search on", samples, "recipes...", end='', flush=True)
+        stats = recallAtK(ann, engine, k=10, samples=samples)
+        print("done.\nrecall@10: {recall:.3f} (avg. {meanCandidates:.0f} candidates, "
+              "{annMs:.2f} ms approximate vs {exactMs:.2f} ms exact per query)".format(**stats))
+        if args.annrecall:
+            return
+        if stats["annMs"] >= stats["exactMs"] or stats["meanCandidates"] > ANN_MAX_SHORTLIST * len(engine):
+            print("Approximate search is no faster than exact search on this dataset, using exact search.")
+            ann = None
+        print("Preparing ingredient search...", end='', flush=True)
+
+    #searches by ingredient only read the recipes that share an ingredient with them
+    pantry = PantrySearch(engine, terms, idf)
 
     print("done.\n", flush=True)
 
+    visual = None
+    if args.images:
+        print("Joining image embeddings...", end='', flush=True)
+        with instrument.stage("images"):
+            try:
+                embeddings = loadEmbeddings(os.getcwd() + '\\Indexes\\' + args.images)
+            except ValueError as e:
+                print("failed.")
+                sys.exit(str(e))
+            visual = VisualSimilarity(embeddings, embeddings.imageRows(store.titles))
+        print("done.\nFound images for", len(visual.withImage), "of", len(store), "recipes.\n")
+
     #allow user to continue to enter different recipes into program
     while True:
         choice = 0
-        while choice not in [1, 2, 3]:
+        while choice not in [1, 2, 3, 4]:
             try:
-                choice = int(input("Enter number of choice:\n1. Enter recipe name.\n2. Random recipe.\n3. Quit\n"))
+                choice = int(input("Enter number of choice:\n1. Enter recipe name.\n2. Random recipe.\n3. Search by ingredients.\n4. Quit\n"))
             except:
-                print("Invalid choice, please enter a number 1-3")
+                print("Invalid choice, please enter a number 1-4")
 
         if choice == 1:
-            recipeIdx, recipeName = getRecipeID(recipeSheet)
+            recipeIdx, recipeName = getRecipeID(store)
         elif choice == 2:
-            recipeName = random.choice(recipeSheet['title'])
-            #get the index of selected recipe
-            recipeIdx = recipeSheet[recipeSheet['title'] == recipeName]['index'].values[0]
+            recipeIdx = random.randrange(len(store))
+            while engine.removed is not None and engine.removed[recipeIdx]:
+                recipeIdx = random.randrange(len(store))
+            recipeName = store[recipeIdx].title
+        elif choice == 3:
+            ingredients, include, exclude = getPantryQuery()
+            print("\nFinding recipes with", ", ".join(ingredients + include))
+            printRecipes(store, pantry.search(ingredients, PANTRY_RESULTS, include, exclude), skipFirst=False)
+            continue
         else:
             return        
 
         print("\nFinding similar recipes to \"" + recipeName + '\"')
-        ingredients = ast.literal_eval((recipeSheet[recipeSheet['title'] == recipeName].values[0])[1])
-        print("Ingredients: ", ", ".join(ingredients))
+        print("Ingredients: ", ", ".join(store[recipeIdx].ingredients))
 
-        #get list of this recipe's similarity scores
-        recSim = list(enumerate(cosSim[recipeIdx]))
-
-        #sort list so most similar recipes are at front
-        sortedSim = sorted(recSim, key=lambda x:x[1], reverse=True)
+        if ann is not None:
+            #approximate search already returns the most similar recipes in order
+            sortedSim = ann.similar(recipeIdx, ANN_RESULTS)
+            if engine.removed is not None:
+                sortedSim = [(row, sim) for row, sim in sortedSim if not engine.removed[row]]
+            visualSim = visual.similarity(recipeIdx) if visual is not None else None
+            if visualSim is not None and sortedSim:
+                #reorder the approximate results by their blended scores
+                rows = np.array([row for row, sim in sortedSim])
+                blended = blendScores(np.array([sim for row, sim in sortedSim]), visualSim[rows], args.visual)
+                sortedSim = [(int(rows[i]), float(blended[i])) for i in np.argsort(-blended, kind='stable')]
+        elif visual is not None:
+            #how alike the dishes look is blended in from the memory-mapped image embeddings
+            scores = blendScores(engine.similarity(recipeIdx), visual.similarity(recipeIdx), args.visual)
+            sortedSim = engine.rankScores(scores)
+        else:
+            #most similar recipes are selected a block at a time as more are shown
+            sortedSim = engine.ranked(recipeIdx)
         
-        printRecipes(recipeSheet, sortedSim)
+        printRecipes(store, sortedSim)
     return
 
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
 import argparse
-import pandas as pd
+import csv
 import os
+import sys
+import instrument
+from recipeStream import iterRecipes
 
 def main():
     #CLA argument definitions
@@ -8,38 +11,41 @@ def main():
     parser.add_argument('--oldfile', '-f', type=str, required=True, help="File containing 1M raw dataset.")
     parser.add_argument('--newfile', '-n', type=str, required=True, help="New file to copy formatted dataset into.")
     parser.add_argument('--overwriteFile', '-o', action='store_false', help="Give warning about overwriting a pre-existing file.")
+    instrument.addArguments(parser)
     args = parser.parse_args()
+    instrument.start(args, "format1MDataset")
 
-    if (args.oldfile).endswith() != ".json":
+    if not (args.oldfile).endswith(".json"):
         sys.exit("File must be .json")
 
     #read CLA for uncleaned data file and new data file name
     oldFile = os.getcwd() + "\\Datasets\\" + args.oldfile
+    newFile = os.getcwd() + "\\Datasets\\" + args.newfile
 
-    print("Loading recipes into program.")
-    sheet = pd.read_json(oldFile)
-    print("Finished")
+    if args.overwriteFile and os.path.isfile(newFile):
+        sys.exit("New file name must not exist to avoid overwriting data.\nDelete \""+
+                    args.newfile+"\", enter a different name, " +
+                    "\nor use the -o argument to ignore this check.")
 
-    row = 0
-    ingredients = []
-    lenIng = len(sheet['ingredients'])
+    #recipes are streamed from the json file and written as they are read,
+    #so the whole dataset is never held in memory
     print("Formatting recipes...")
-    for recipe in sheet['ingredients']:
-        ing = []
-        for ingredient in recipe:
-            ing.append(ingredient['text'])
-        
-        sheet['ingredients'][row] = [*ing]
-        #sheet['ingredients'][row] = rIng
-        #print("sheet['ingredients'][row]: ", sheet['ingredients'][row])
-        
-        row += 1
-        print("\r", end='')
-        print("Current row: ", row, "out of ", lenIng, end='')
-    print(" done.")
-    #print(sheet.info)
-    sheet.to_csv(os.getcwd() + '\\Datasets\\out.csv')
-    sys.exit("Successfully copied data to: \\Datasets\\out.csv\nPlease run this program again with this formatted file.")
+    row = 0
+    progress = instrument.Progress("Current row")
+    with open(newFile, 'w', newline='', encoding='utf-8') as f, instrument.stage("format"):
+        writer = csv.writer(f)
+        columns = None
+        for recipe in iterRecipes(oldFile):
+            if columns is None:
+                columns = list(recipe.keys())
+                #blank first header matches the unnamed index column pandas writes
+                writer.writerow([''] + columns)
+            writer.writerow([row] + [recipe.get(col, '') for col in columns])
+            row += 1
+            progress.set(row)
+    progress.finish()
+    instrument.count('rowsFormatted', row)
+    sys.exit("Successfully copied data to: \\Datasets\\" + args.newfile + "\nPlease run this program again with this formatted file.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
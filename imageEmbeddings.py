@@ -0,0 +1,349 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   imageEmbeddings.py
+#   Purpose:    Describes every dish photo in FoodImages with a
+#               small colour and texture vector, computed once,
+#               so recommendations can also take into account
+#               how similar two dishes look.
+#
+########################################################
+
+import os
+import re
+import sys
+import json
+import argparse
+import multiprocessing
+import numpy as np
+import instrument
+
+try:
+    from PIL import Image
+except ImportError:
+    #only needed to build embeddings, not to use them
+    Image = None
+
+EMBEDDING_VERSION = 1
+
+#side (in pixels) images are shrunk to before they are described
+IMAGE_SIZE = 64
+
+IMAGE_TYPES = (".jpg", ".jpeg", ".png")
+
+#bins of the hue, saturation and value colour histogram
+HUE_BINS, SAT_BINS, VAL_BINS = 12, 3, 3
+#bins of the gradient orientation histogram, computed in each cell of a GRID x GRID grid
+ORIENTATION_BINS = 8
+GRID = 2
+#bins of the gradient strength histogram
+MAGNITUDE_BINS = 8
+#average colour is kept for each cell of a LAYOUT x LAYOUT grid
+LAYOUT = 4
+
+#relative weight of the colour histogram, texture and colour layout blocks
+BLOCK_WEIGHTS = (1.0, 1.0, 0.5)
+
+#largest gradient strength counted separately by the gradient strength histogram
+MAX_MAGNITUDE = 0.5
+
+non_slug_pattern = re.compile(r"[^a-z0-9]+")
+#image names end in a numeric id, e.g. 'burnt-carrots-and-parsnips-56390131'
+image_id_pattern = re.compile(r"-\d+$")
+
+
+def slug(title):
+    """
+    :param title: Recipe title.
+    :return: Title in the form images are named after, e.g. 'burnt-carrots-and-parsnips'.
+    """
+    return non_slug_pattern.sub('-', str(title).lower()).strip('-')
+
+
+def imageSlug(fileName):
+    """
+    :param fileName: Name of an image file.
+    :return: Slug of the title of the recipe in the image.
+    """
+    name = os.path.splitext(os.path.basename(fileName))[0]
+    return slug(image_id_pattern.sub('', name))
+
+
+def loadImage(fileName, size=IMAGE_SIZE):
+    """
+    :return: size x size x 3 uint8 RGB array of the image.
+    """
+    with Image.open(fileName) as image:
+        #jpegs can be decoded straight to a fraction of their size, which is much faster
+        image.draft('RGB', (size * 2, size * 2))
+        return np.asarray(image.convert('RGB').resize((size, size), Image.BILINEAR))
+
+
+def rgbToHSV(pixels):
+    """
+    :param pixels: (..., 3) float array of RGB values between 0 and 1.
+    :return: (..., 3) float array of hue, saturation and value between 0 and 1.
+    """
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    value = pixels.max(axis=-1)
+    chroma = value - pixels.min(axis=-1)
+    saturation = np.where(value > 0, chroma / np.maximum(value, 1e-12), 0)
+    safeChroma = np.maximum(chroma, 1e-12)
+    hue = np.select([value == r, value == g], [(g - b) / safeChroma, 2 + (b - r) / safeChroma],
+                    4 + (r - g) / safeChroma)
+    hue = np.where(chroma > 0, (hue / 6) % 1, 0)
+    return np.stack([hue, saturation, value], axis=-1)
+
+
+def histograms(bins, numBins, weights=None):
+    """
+    :param bins: (images, values) integer array of the bin of every value.
+    :return: (images, numBins) array with each image's histogram.
+    """
+    offsets = bins + numBins * np.arange(len(bins))[:, None]
+    counts = np.bincount(offsets.ravel(), weights=None if weights is None else weights.ravel(),
+                         minlength=numBins * len(bins))
+    return counts.reshape(len(bins), numBins)
+
+
+def normalizeRows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def describe(images):
+    """
+    Describes a batch of images by their colours and textures:
+     - a histogram of their hue, saturation and value
+     - histograms of the direction of edges in each cell of a grid, weighted by how
+       strong the edges are, along with a histogram of the edge strengths
+     - the average colour of each cell of a grid
+
+    :param images: (images, size, size, 3) uint8 array of RGB images.
+    :return: (images, dimensions) float32 array with one description per image.
+    """
+    pixels = images.astype(np.float32) / 255
+    n, size = len(images), images.shape[1]
+
+    hsv = rgbToHSV(pixels).reshape(n, -1, 3)
+    hueBin = np.minimum((hsv[..., 0] * HUE_BINS).astype(np.int64), HUE_BINS - 1)
+    satBin = np.minimum((hsv[..., 1] * SAT_BINS).astype(np.int64), SAT_BINS - 1)
+    valBin = np.minimum((hsv[..., 2] * VAL_BINS).astype(np.int64), VAL_BINS - 1)
+    colour = histograms((hueBin * SAT_BINS + satBin) * VAL_BINS + valBin, HUE_BINS * SAT_BINS * VAL_BINS)
+
+    gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    dy, dx = np.gradient(gray, axis=(1, 2))
+    magnitude = np.hypot(dx, dy)
+    #edges pointing opposite ways look the same, so only half a circle of directions is used
+    orientation = np.minimum((np.mod(np.arctan2(dy, dx), np.pi) / np.pi * ORIENTATION_BINS).astype(np.int64),
+                             ORIENTATION_BINS - 1)
+    cell = size // GRID
+    cellIdx = (np.arange(size) // cell).clip(max=GRID - 1)
+    cellOf = cellIdx[:, None] * GRID + cellIdx[None, :]
+    texture = histograms((cellOf * ORIENTATION_BINS + orientation).reshape(n, -1),
+                         GRID * GRID * ORIENTATION_BINS, magnitude.reshape(n, -1))
+    magBin = np.minimum((magnitude / MAX_MAGNITUDE * MAGNITUDE_BINS).astype(np.int64), MAGNITUDE_BINS - 1)
+    strength = histograms(magBin.reshape(n, -1), MAGNITUDE_BINS)
+
+    layoutCell = size // LAYOUT
+    layout = pixels[:, :layoutCell * LAYOUT, :layoutCell * LAYOUT].reshape(
+        n, LAYOUT, layoutCell, LAYOUT, layoutCell, 3).mean(axis=(2, 4)).reshape(n, -1)
+
+    blocks = [normalizeRows(colour), normalizeRows(np.hstack([texture, strength])), normalizeRows(layout)]
+    return np.hstack([block * weight for block, weight in zip(blocks, BLOCK_WEIGHTS)]).astype(np.float32)
+
+
+def describeFiles(fileNames):
+    """
+    Decodes and describes a batch of image files inside of a worker process.
+
+    :return: (descriptions, ok) with one description per file and whether the file could be read.
+    """
+    images = np.zeros((len(fileNames), IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.uint8)
+    ok = np.zeros(len(fileNames), dtype=bool)
+    for i, fileName in enumerate(fileNames):
+        try:
+            images[i] = loadImage(fileName)
+            ok[i] = True
+        except (OSError, ValueError):
+            #unreadable or truncated images are left out
+            pass
+    return describe(images), ok
+
+
+def buildEmbeddings(imageDir, workers=1, batchSize=64):
+    """
+    Describes every image in a folder. Images are decoded and described a batch at a
+    time, by several processes if there is more than one worker. The descriptions are
+    centred on their average before being L2 normalized, so the dot product of two
+    embeddings measures how much more alike two dishes look than dishes in general.
+
+    :param imageDir: Folder of images.
+    :param workers: Number of processes to decode images with.
+    :param batchSize: Number of images decoded and described at a time.
+    :return: (keys, embeddings) with the slug of every readable image and a float32 array of its embeddings.
+    """
+    fileNames = sorted(os.path.join(imageDir, name) for name in os.listdir(imageDir)
+                       if name.lower().endswith(IMAGE_TYPES))
+    batches = [fileNames[i:i+batchSize] for i in range(0, len(fileNames), batchSize)]
+
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    #imap hands back batches in the order they were sent
+    results = pool.imap(describeFiles, batches) if pool is not None else map(describeFiles, batches)
+    progress = instrument.Progress("Images", len(fileNames))
+    descriptions, ok = [], []
+    try:
+        for batchDescriptions, batchOk in results:
+            descriptions.append(batchDescriptions)
+            ok.append(batchOk)
+            progress.update(len(batchOk))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    progress.finish()
+
+    ok = np.concatenate(ok) if ok else np.zeros(0, dtype=bool)
+    embeddings = np.concatenate(descriptions)[ok] if descriptions else np.zeros((0, 0), dtype=np.float32)
+    instrument.count('imagesDescribed', int(ok.sum()))
+    instrument.count('imagesUnreadable', int((~ok).sum()))
+    if len(embeddings):
+        embeddings = normalizeRows(embeddings - embeddings.mean(axis=0))
+    keys = [imageSlug(fileName) for fileName, good in zip(fileNames, ok) if good]
+    return keys, embeddings.astype(np.float32)
+
+
+def saveEmbeddings(embeddingDir, keys, embeddings, meta=None):
+    """
+    Saves embeddings as a float16 matrix that is memory-mapped when loaded, along with
+    the slug each row belongs to.
+    """
+    os.makedirs(embeddingDir, exist_ok=True)
+    np.save(os.path.join(embeddingDir, "embeddings.npy"), embeddings.astype(np.float16), allow_pickle=False)
+    info = {"version": EMBEDDING_VERSION, "imageSize": IMAGE_SIZE, "dimensions": int(embeddings.shape[1]),
+            "keys": keys}
+    info.update(meta or {})
+    with open(os.path.join(embeddingDir, "meta.json"), 'w') as f:
+        json.dump(info, f)
+
+
+class ImageEmbeddings:
+    """
+    Image embeddings saved by saveEmbeddings. The matrix is memory-mapped, so loading
+    it is instant and only the rows that are used are read from disk.
+    """
+
+    def __init__(self, embeddingDir):
+        """
+        :param embeddingDir: Folder written by saveEmbeddings. ValueError is raised if its
+                             embeddings were saved by a different version or are damaged.
+        """
+        with open(os.path.join(embeddingDir, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != EMBEDDING_VERSION:
+            raise ValueError("Image embeddings in " + embeddingDir + " are out of date. Build them again.")
+        self.keys = self.meta["keys"]
+        self.embeddings = np.load(os.path.join(embeddingDir, "embeddings.npy"), mmap_mode='r', allow_pickle=False)
+        if self.embeddings.shape != (len(self.keys), self.meta.get("dimensions")):
+            raise ValueError("Image embeddings in " + embeddingDir + " don't match their meta.json. Build them again.")
+        self.rows = {}
+        for row, key in enumerate(self.keys):
+            self.rows.setdefault(key, row)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def imageRows(self, titles):
+        """
+        Joins the embeddings to a dataset through the slugs of its titles.
+
+        :param titles: List of recipe titles, in row order.
+        :return: int32 array with the embedding row of each recipe, or -1 if it has no image.
+        """
+        return np.fromiter((self.rows.get(slug(title), -1) for title in titles), dtype=np.int32,
+                           count=len(titles))
+
+
+def loadEmbeddings(embeddingDir):
+    return ImageEmbeddings(embeddingDir)
+
+
+class VisualSimilarity:
+    """
+    How alike the photos of recipes look, for recipes joined to image embeddings.
+    """
+
+    def __init__(self, embeddings, imageRows, blockSize=65536):
+        """
+        :param embeddings: ImageEmbeddings of the dataset's images.
+        :param imageRows: Embedding row of each recipe from ImageEmbeddings.imageRows.
+        :param blockSize: Number of embeddings converted to float32 at a time.
+        """
+        self.embeddings = embeddings.embeddings
+        self.imageRows = imageRows
+        self.blockSize = blockSize
+        self.withImage = np.flatnonzero(imageRows >= 0)
+
+    def similarity(self, recipeIdx):
+        """
+        :param recipeIdx: Row of the recipe to compare against.
+        :return: Array of visual similarity scores, one per recipe, which is NaN for recipes
+                 without an image, or None if the recipe itself has no image.
+        """
+        queryRow = self.imageRows[recipeIdx]
+        if queryRow < 0:
+            return None
+        query = np.asarray(self.embeddings[queryRow], dtype=np.float32)
+        #each image is only scored once even if several recipes share it
+        imageScores = np.empty(len(self.embeddings), dtype=np.float32)
+        for start in range(0, len(self.embeddings), self.blockSize):
+            block = np.asarray(self.embeddings[start:start + self.blockSize], dtype=np.float32)
+            imageScores[start:start + len(block)] = block @ query
+        scores = np.full(len(self.imageRows), np.nan)
+        scores[self.withImage] = imageScores[self.imageRows[self.withImage]]
+        return scores
+
+
+def blendScores(ingredientScores, visualScores, weight):
+    """
+    :param ingredientScores: Array of ingredient similarity scores.
+    :param visualScores: Array of visual similarity scores from VisualSimilarity.similarity (or None).
+    :param weight: How much (0-1) the visual similarity counts.
+    :return: Weighted average of the scores. Recipes without an image keep their ingredient score.
+    """
+    if visualScores is None or weight <= 0:
+        return ingredientScores
+    return np.where(np.isnan(visualScores), ingredientScores,
+                    (1 - weight) * ingredientScores + weight * visualScores)
+
+
+def main():
+    parser = argparse.ArgumentParser("Describe the dish photos in a folder for visual recommendations.\n")
+    parser.add_argument('--imagedir', '-d', type=str, default="FoodImages", help="Folder of dish photos, named after their recipe's title.")
+    parser.add_argument('--name', '-n', type=str, required=True, help="Name to save the embeddings under in the Indexes folder.")
+    parser.add_argument('--workers', '-w', type=int, default=1, help="Number of processes to decode images with.")
+    parser.add_argument('--batchsize', '-b', type=int, default=64, help="Number of images decoded and described at a time.")
+    instrument.addArguments(parser)
+    args = parser.parse_args()
+    instrument.start(args, "imageEmbeddings")
+
+    if Image is None:
+        sys.exit("Pillow is needed to read images. Install it with: pip install Pillow")
+    if not os.path.isdir(args.imagedir):
+        sys.exit("\"" + args.imagedir + "\" is not a folder.")
+
+    with instrument.stage("describe"):
+        keys, embeddings = buildEmbeddings(args.imagedir, args.workers, args.batchsize)
+    embeddingDir = os.getcwd() + '\\Indexes\\' + args.name
+    with instrument.stage("save"):
+        saveEmbeddings(embeddingDir, keys, embeddings, {"imagedir": args.imagedir})
+    print("Saved", len(keys), "image embeddings of", embeddings.shape[1], "dimensions to " + embeddingDir)
+
+
+if __name__ == "__main__":
+    main()
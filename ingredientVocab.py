@@ -0,0 +1,70 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   ingredientVocab.py
+#   Purpose:    Fast lookup of valid ingredient names used
+#               while cleaning recipes.
+#
+########################################################
+
+#marks the end of a valid ingredient inside the token trie
+END = ''
+
+
+class IngredientVocab:
+    """
+    Set of valid ingredient names. Exact lookups go through a frozenset and
+    multi-word ingredients are also kept in a trie of their words, so the
+    longest ingredient starting at any word of a line can be found by walking
+    the words once instead of testing every combination of them.
+    """
+
+    def __init__(self, ingredients):
+        """
+        :param ingredients: Iterable of valid (lowercase) ingredient names.
+        """
+        self.words = frozenset(ingredients)
+        self.trie = {}
+        for ingredient in self.words:
+            node = self.trie
+            for token in ingredient.split(' '):
+                node = node.setdefault(token, {})
+            node[END] = ingredient
+
+    def __contains__(self, ingredient):
+        return ingredient in self.words
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __reduce__(self):
+        #rebuilding from the names is cheaper to send to worker processes than the trie
+        return (IngredientVocab, (list(self.words),))
+
+    def longestMatch(self, tokens, start=0, maxWords=None):
+        """
+        Finds the longest valid ingredient made of consecutive tokens.
+
+        :param tokens: List of words.
+        :param start: Position of the first word of the ingredient.
+        :param maxWords: Longest ingredient (in words) to look for.
+        :return: Number of words in the longest match (0 if there is none).
+        """
+        node = self.trie
+        longest = 0
+        end = len(tokens) if maxWords is None else min(len(tokens), start + maxWords)
+        for i in range(start, end):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if END in node:
+                longest = i - start + 1
+        return longest
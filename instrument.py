@@ -0,0 +1,202 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   instrument.py
+#   Purpose:    Progress reporting, stage timers, counters and
+#               optional profiling shared by every program, with
+#               a json summary of them written at exit.
+#
+########################################################
+
+import io
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import tracemalloc
+import collections
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    #not available on Windows, where peak memory is not reported
+    resource = None
+
+#least time (in seconds) between two progress updates
+PROGRESS_INTERVAL = 0.5
+
+#number of functions or allocation sites listed by --profile
+PROFILE_LINES = 25
+
+#wall and cpu time of every stage, by name
+stages = {}
+#counts of anything worth tracking (rows cleaned, lines dropped...), by name
+counters = collections.Counter()
+
+started = time.perf_counter()
+startedCPU = time.process_time()
+
+#with --profile tracemalloc, the allocations when the most memory was in use at the end of a stage
+largestSnapshot = None
+largestTraced = 0
+largestStage = None
+
+
+def peakRSS():
+    """
+    :return: Most memory (in MB) this process has used so far, or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Progress:
+    """
+    Progress line that is rewritten in place at most once every interval seconds,
+    so updating it for every row costs almost nothing.
+    """
+
+    def __init__(self, label, total=None, interval=PROGRESS_INTERVAL):
+        """
+        :param label: Text shown before the count.
+        :param total: Count at which the work is done, if it is known.
+        :param interval: Least time (in seconds) between two updates.
+        """
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def update(self, n=1):
+        self.set(self.count + n)
+
+    def set(self, count):
+        self.count = count
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.show(now)
+
+    def show(self, now):
+        self.last = now
+        rate = self.count / max(now - self.start, 1e-9)
+        print("\r" + self.label + ": " + str(self.count) +
+              (" out of " + str(self.total) if self.total is not None else "") +
+              " ({:.0f} per second)".format(rate), end='', flush=True)
+
+    def finish(self, newline=True):
+        """
+        Shows the final count.
+
+        :param newline: End the progress line (otherwise the next progress line replaces it).
+        """
+        self.show(time.perf_counter())
+        if newline:
+            print()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Times the code inside of the with statement. Stages run more than once add
+    up their times.
+
+    :param name: Name the stage is reported under.
+    """
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        timing = stages.setdefault(name, {"wallSeconds": 0.0, "cpuSeconds": 0.0, "calls": 0})
+        timing["wallSeconds"] += time.perf_counter() - wall
+        timing["cpuSeconds"] += time.process_time() - cpu
+        timing["calls"] += 1
+        if tracemalloc.is_tracing():
+            snapshotIfLargest(name)
+
+
+def snapshotIfLargest(name):
+    global largestSnapshot, largestTraced, largestStage
+    traced = tracemalloc.get_traced_memory()[0]
+    if traced >= largestTraced:
+        largestSnapshot = tracemalloc.take_snapshot()
+        largestTraced = traced
+        largestStage = name
+
+
+def count(name, n=1):
+    counters[name] += n
+
+
+def summary(entryPoint=None):
+    """
+    :return: Dictionary of the run's total time, peak memory, stages and counters.
+    """
+    return {"entryPoint": entryPoint, "argv": sys.argv[1:],
+            "wallSeconds": time.perf_counter() - started, "cpuSeconds": time.process_time() - startedCPU,
+            "peakRssMB": peakRSS(), "stages": stages, "counters": dict(counters)}
+
+
+def addArguments(parser):
+    """
+    Adds the --profile and --summary options to a program's argument parser.
+    """
+    parser.add_argument('--profile', type=str, choices=['cprofile', 'tracemalloc'], help="Profile the run's cpu time (cprofile) or memory allocations (tracemalloc) and print the top results at exit.")
+    parser.add_argument('--summary', type=str, help="Write a json summary of stage timings and counters to this file at exit ('-' to print it).")
+
+
+def start(args, entryPoint):
+    """
+    Starts any profiling asked for on the command line and reports it, along with
+    the summary, when the program exits (including through sys.exit).
+
+    :param args: Parsed arguments from a parser given to addArguments.
+    :param entryPoint: Name of the program, used for the profile's file name.
+    """
+    profiler = None
+    if args.profile == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif args.profile == 'tracemalloc':
+        tracemalloc.start()
+    atexit.register(finish, args, entryPoint, profiler)
+
+
+def finish(args, entryPoint, profiler=None):
+    if profiler is not None:
+        profiler.disable()
+        profileFile = entryPoint + ".prof"
+        profiler.dump_stats(profileFile)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        print("\nProfile saved to " + os.path.abspath(profileFile) + "\n" + report.getvalue(), file=sys.stderr)
+    elif tracemalloc.is_tracing():
+        snapshotIfLargest("exit")
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("\nTraced memory: {:.1f} MB at peak. Largest allocation sites at the end of {} ({:.1f} MB in use):".format(
+            peak / 2**20, largestStage, largestTraced / 2**20), file=sys.stderr)
+        for line in largestSnapshot.statistics('lineno')[:PROFILE_LINES]:
+            print("  " + str(line), file=sys.stderr)
+
+    if args.summary:
+        text = json.dumps(summary(entryPoint), indent=2)
+        if args.summary == '-':
+            print(text)
+        else:
+            with open(args.summary, 'w', encoding='utf-8') as f:
+                f.write(text)
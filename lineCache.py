@@ -0,0 +1,134 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   lineCache.py
+#   Purpose:    Remembers the cleaned ingredient of every raw
+#               ingredient line so lines that repeat across
+#               recipes and datasets are only cleaned once.
+#               The most recently used lines are kept when the
+#               cache is full.
+#
+########################################################
+
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+#returned by LineCache.get for lines that are not cached (None is a cached result)
+MISSING = object()
+
+
+def lineKey(line):
+    """
+    :param line: Raw ingredient line.
+    :return: 64-bit hash of the line, used in place of the line itself.
+    """
+    return int.from_bytes(hashlib.blake2b(line.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class LineCache:
+    """
+    Cleaned ingredient (or None when a line has no valid ingredient) of raw
+    ingredient lines, keyed by lineKey. Results depend on the valid ingredients
+    and cleaning options, so every cache carries a fingerprint of them and a
+    saved cache is only reused by a run with the same fingerprint.
+
+    Lines are kept in order of use, so once the cache holds maxSize lines the
+    least recently used line is dropped for every new one. Lookups through get
+    are counted as hits or misses.
+    """
+
+    def __init__(self, fingerprint, maxSize=None):
+        """
+        :param fingerprint: String identifying the ingredients and options lines were cleaned with.
+        :param maxSize: Most lines to keep (no limit if None or 0).
+        """
+        self.fingerprint = fingerprint
+        self.maxSize = maxSize or None
+        self.lines = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __contains__(self, key):
+        return key in self.lines
+
+    def __getitem__(self, key):
+        return self.lines[key]
+
+    def __setitem__(self, key, ingredient):
+        self.lines[key] = ingredient
+        self.lines.move_to_end(key)
+        if self.maxSize is not None:
+            while len(self.lines) > self.maxSize:
+                self.lines.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key, default=MISSING):
+        """
+        :param key: lineKey of a raw ingredient line.
+        :return: Cleaned ingredient of the line, or default if it is not cached.
+        """
+        ingredient = self.lines.get(key, MISSING)
+        if ingredient is MISSING:
+            self.misses += 1
+            return default
+        self.lines.move_to_end(key)
+        self.hits += 1
+        return ingredient
+
+    def stats(self):
+        """
+        :return: Summary of the cache's hits, misses and size.
+        """
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0
+        return ("Line cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses ("
+                + format(rate, '.1f') + "% hit rate), " + str(len(self)) + " lines kept, "
+                + str(self.evictions) + " evicted.")
+
+    def save(self, fileName):
+        """
+        Saves the cache as an .npz file. Cleaned ingredients are stored once each,
+        with every line holding the position of its ingredient (-1 for None).
+        Lines are saved from least to most recently used.
+        """
+        names = {}
+        keys = np.fromiter(self.lines.keys(), dtype=np.uint64, count=len(self.lines))
+        values = np.fromiter((-1 if name is None else names.setdefault(name, len(names))
+                              for name in self.lines.values()), dtype=np.int32, count=len(self.lines))
+        #write to a temporary file first so an interrupted save keeps the old cache
+        with open(fileName + ".tmp", 'wb') as f:
+            np.savez(f, fingerprint=np.asarray(self.fingerprint), keys=keys, values=values,
+                     names=np.asarray(sorted(names, key=names.get), dtype=str))
+        os.replace(fileName + ".tmp", fileName)
+
+    @classmethod
+    def load(cls, fileName, fingerprint, maxSize=None):
+        """
+        :param fileName: Cache file written by save.
+        :param fingerprint: Fingerprint of the current ingredients and options.
+        :param maxSize: Most lines to keep; the most recently used saved lines are loaded.
+        :return: Saved cache, or an empty one if it is missing or was made with a different fingerprint.
+        """
+        cache = cls(fingerprint, maxSize)
+        if not os.path.isfile(fileName):
+            return cache
+        with np.load(fileName, allow_pickle=False) as data:
+            if str(data['fingerprint']) != fingerprint:
+                return cache
+            names = data['names'].tolist() + [None]
+            keys, values = data['keys'], data['values']
+            if cache.maxSize is not None:
+                keys, values = keys[-cache.maxSize:], values[-cache.maxSize:]
+            cache.lines = OrderedDict(zip(keys.tolist(), [names[i] for i in values.tolist()]))
+        return cache
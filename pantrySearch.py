@@ -0,0 +1,95 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   pantrySearch.py
+#   Purpose:    Finds recipes for a list of ingredients on hand
+#               by only looking at the recipes that share at
+#               least one ingredient with them.
+#
+########################################################
+
+import numpy as np
+from recipeFeatures import QueryVectorizer
+from recipeSimilarity import topK
+
+
+def splitIngredients(text):
+    """
+    :param text: Comma separated ingredients, e.g. "chicken, lime, cilantro".
+    :return: List of the ingredients.
+    """
+    return [ingredient.strip().lower() for ingredient in text.split(',') if ingredient.strip()]
+
+
+class PantrySearch:
+    """
+    Ingredient search over the transposed feature vectors, which are an inverted
+    index: row i of featuresT is the posting list of every recipe containing
+    ingredient i along with the ingredient's weight in that recipe. A query only
+    reads the posting lists of its own ingredients, so its cost depends on how
+    common those ingredients are and not on the number of recipes.
+    """
+
+    def __init__(self, engine, terms, idf):
+        """
+        :param engine: SimilarityEngine holding the feature vectors.
+        :param terms: Feature names, in column order of the feature vectors.
+        :param idf: Inverse document frequency weight of every feature.
+        """
+        self.engine = engine
+        self.vectorizer = QueryVectorizer(terms, idf)
+
+    def postings(self, col):
+        """
+        :return: (rows, weights) of every recipe containing the feature in column col.
+        """
+        featuresT = self.engine.featuresT
+        start, end = featuresT.indptr[col], featuresT.indptr[col + 1]
+        return np.asarray(featuresT.indices[start:end]), np.asarray(featuresT.data[start:end])
+
+    def recipesWith(self, ingredient):
+        """
+        :param ingredient: Ingredient name, possibly of several words.
+        :return: Sorted rows of the recipes with an ingredient containing every word of
+                 the ingredient (e.g. 'chicken' also finds 'chicken breast').
+        """
+        rows = [self.postings(col)[0] for col in self.vectorizer.containing(ingredient)]
+        return np.unique(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.int64)
+
+    def search(self, ingredients, k=10, include=(), exclude=()):
+        """
+        :param ingredients: List of ingredients to find recipes for.
+        :param k: Number of recipes to return.
+        :param include: Ingredients every returned recipe must have (also added to the query).
+        :param exclude: Ingredients no returned recipe may have.
+        :return: List of (row, similarity) pairs, most similar first.
+        """
+        query = self.vectorizer.transform([list(ingredients) + list(include)])
+        if query.nnz == 0:
+            return []
+
+        #add up each recipe's score from the posting lists of the query's ingredients
+        rows, weights = [], []
+        for col, weight in zip(query.indices, query.data):
+            postingRows, postingWeights = self.postings(col)
+            rows.append(postingRows)
+            weights.append(postingWeights * weight)
+        candidates, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+
+        keep = np.ones(len(candidates), dtype=bool)
+        for ingredient in include:
+            keep &= np.isin(candidates, self.recipesWith(ingredient), assume_unique=True)
+        for ingredient in exclude:
+            keep &= ~np.isin(candidates, self.recipesWith(ingredient), assume_unique=True)
+        if self.engine.removed is not None:
+            keep &= ~self.engine.removed[candidates]
+        candidates, scores = candidates[keep], scores[keep]
+
+        top = topK(scores, k)
+        return list(zip(candidates[top].tolist(), scores[top].tolist()))
@@ -0,0 +1,132 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeColumnar.py
+#   Purpose:    Compact binary format for cleaned datasets.
+#               Ingredients are stored as ids into a shared
+#               ingredient list so nothing has to be parsed
+#               from text when the dataset is loaded.
+#
+########################################################
+
+import numpy as np
+import scipy.sparse as sp
+from recipeIndex import encodeStrings, decodeStrings
+from recipeStore import LINK_COLUMNS
+
+#version of the columnar format written by ColumnarWriter
+COLUMNAR_VERSION = 1
+
+
+class ColumnarWriter:
+    """
+    Collects cleaned recipes a batch at a time and saves them as a compressed
+    .npz file. Each recipe's ingredients are kept as int32 ids into a vocabulary
+    of every ingredient seen, with an offsets array marking where each recipe's
+    ids start.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.ids = []
+        self.lengths = []
+        self.index = []
+        self.titles = []
+        self.links = []
+
+    def __len__(self):
+        return len(self.titles)
+
+    def append(self, sheet, column):
+        """
+        :param sheet: Dataframe of cleaned recipes with a 'title' column and a link column.
+        :param column: Column containing the lists of cleaned ingredients.
+        """
+        linkCol = next((col for col in LINK_COLUMNS if col in sheet.columns), None)
+        indexes = sheet['index'] if 'index' in sheet.columns else range(len(self), len(self) + len(sheet))
+        for recipe in sheet[column]:
+            ids = [self.vocabulary.setdefault(ingredient, len(self.vocabulary)) for ingredient in recipe]
+            self.ids.append(np.asarray(ids, dtype=np.int32))
+            self.lengths.append(len(ids))
+        self.index.extend(int(i) for i in indexes)
+        self.titles.extend(str(title) for title in sheet['title'])
+        if linkCol:
+            self.links.extend(str(link) for link in sheet[linkCol])
+        else:
+            self.links.extend([''] * len(sheet))
+
+    def save(self, fileName):
+        offsets = np.zeros(len(self.lengths) + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=offsets[1:])
+        ids = np.concatenate(self.ids) if self.ids else np.zeros(0, dtype=np.int32)
+        titleBlob, titleOffsets = encodeStrings(self.titles)
+        linkBlob, linkOffsets = encodeStrings(self.links)
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez_compressed(fileName,
+                            version=np.int32(COLUMNAR_VERSION),
+                            vocabulary=np.asarray(vocabulary, dtype=str),
+                            ingredient_ids=ids,
+                            ingredient_offsets=offsets,
+                            index=np.asarray(self.index, dtype=np.int64),
+                            title_blob=titleBlob,
+                            title_offsets=titleOffsets,
+                            link_blob=linkBlob,
+                            link_offsets=linkOffsets)
+
+
+def saveColumnar(fileName, sheet, column):
+    """
+    Saves a dataframe of cleaned recipes in the columnar format.
+
+    :param fileName: Name of the .npz file to write.
+    :param sheet: Dataframe of cleaned recipes.
+    :param column: Column containing the lists of cleaned ingredients.
+    """
+    writer = ColumnarWriter()
+    writer.append(sheet, column)
+    writer.save(fileName)
+
+
+class ColumnarRecipes:
+    """
+    Cleaned dataset loaded from a columnar .npz file.
+    """
+
+    def __init__(self, fileName):
+        with np.load(fileName, allow_pickle=False) as data:
+            if int(data['version']) != COLUMNAR_VERSION:
+                raise ValueError("\"" + fileName + "\" was written by a different version. Clean the dataset again.")
+            self.vocabulary = data['vocabulary'].tolist()
+            self.ingredientIds = data['ingredient_ids']
+            self.ingredientOffsets = data['ingredient_offsets']
+            self.index = data['index']
+            self.titles = decodeStrings(data['title_blob'], data['title_offsets'])
+            self.links = decodeStrings(data['link_blob'], data['link_offsets'])
+
+    def __len__(self):
+        return len(self.titles)
+
+    def ingredients(self):
+        """
+        :return: List of each recipe's ingredient names as a tuple.
+        """
+        names = np.asarray(self.vocabulary, dtype=object)[self.ingredientIds].tolist()
+        offsets = self.ingredientOffsets.tolist()
+        return [tuple(names[offsets[i]:offsets[i + 1]]) for i in range(len(self))]
+
+    def countMatrix(self):
+        """
+        :return: Sparse (recipes x vocabulary) matrix with a 1 for every ingredient a recipe has.
+        """
+        data = np.ones(len(self.ingredientIds), dtype=np.float64)
+        return sp.csr_matrix((data, self.ingredientIds, self.ingredientOffsets),
+                             shape=(len(self), len(self.vocabulary)))
+
+
+def loadColumnar(fileName):
+    return ColumnarRecipes(fileName)
@@ -0,0 +1,192 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeDedup.py
+#   Purpose:    Finds recipes whose ingredients are nearly the
+#               same (usually copies of one recipe under slightly
+#               different titles) without comparing every pair
+#               of recipes.
+#
+########################################################
+
+import numpy as np
+
+#number of MinHash values kept for every recipe
+NUM_HASHES = 64
+#the MinHash values are split into this many bands; recipes sharing any band are compared
+BANDS = 16
+
+#every recipe is compared with up to this many recipes after it in a bucket, so buckets
+#of up to BUCKET_WINDOW + 1 recipes are compared all against all
+BUCKET_WINDOW = 8
+
+#recipes with fewer ingredients than this are never counted as near duplicates, since
+#short lists (e.g. 'flour, egg, milk') are shared by many different dishes
+MIN_INGREDIENTS = 3
+
+#number of recipes hashed (or pairs of recipes compared) at a time
+CHUNK_SIZE = 50000
+
+
+def tokenize(recipes, minIngredients=MIN_INGREDIENTS):
+    """
+    :param recipes: List of cleaned ingredient lists.
+    :return: (rows, tokens, indptr) with the rows of the recipes that have enough
+             ingredients, and the ids of their distinct ingredients in CSR form.
+    """
+    tokenIds = {}
+    rows, tokens, indptr = [], [], [0]
+    for row, recipe in enumerate(recipes):
+        #ids are given in order of appearance (a set's order changes with every run's
+        #string hash seed, and so would the MinHash values of each ingredient)
+        ingredients = dict.fromkeys(recipe)
+        if len(ingredients) < minIngredients:
+            continue
+        rows.append(row)
+        tokens.extend(tokenIds.setdefault(ingredient, len(tokenIds)) for ingredient in ingredients)
+        indptr.append(len(tokens))
+    return (np.asarray(rows, dtype=np.int64), np.asarray(tokens, dtype=np.int64),
+            np.asarray(indptr, dtype=np.int64), len(tokenIds))
+
+
+def minhashSignatures(tokens, indptr, numTokens, numHashes=NUM_HASHES, seed=0):
+    """
+    Computes a MinHash signature for every set of tokens. Each of the numHashes hash
+    functions gives every token a random value, and a set's signature holds the
+    smallest value of its tokens under each of them. Two sets get the same value
+    for a hash function with a probability equal to their Jaccard similarity.
+
+    :param tokens: Token ids of every set, back to back.
+    :param indptr: Start of each set in tokens, followed by the end of the last one.
+    :param numTokens: Number of distinct token ids.
+    :return: (sets, numHashes) uint32 array of signatures.
+    """
+    hashes = np.random.default_rng(seed).integers(0, 2**32, size=(numTokens, numHashes), dtype=np.uint32)
+    numSets = len(indptr) - 1
+    signatures = np.empty((numSets, numHashes), dtype=np.uint32)
+    for start in range(0, numSets, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, numSets)
+        values = hashes[tokens[indptr[start]:indptr[end]]]
+        signatures[start:end] = np.minimum.reduceat(values, indptr[start:end] - indptr[start], axis=0)
+    return signatures
+
+
+def bandPairs(signatures, band, rowsPerBand, window=BUCKET_WINDOW):
+    """
+    :return: (a, b) arrays of candidate pairs of sets whose values in the band are the
+             same. Every set is paired with the next window sets in its bucket, so
+             members of small buckets are all compared with each other.
+    """
+    #random odd multipliers combine the band's values into one 64 bit key
+    multipliers = np.random.default_rng(band).integers(1, 2**63, size=rowsPerBand, dtype=np.uint64) | np.uint64(1)
+    values = signatures[:, band * rowsPerBand:(band + 1) * rowsPerBand].astype(np.uint64)
+    keys = (values * multipliers).sum(axis=1, dtype=np.uint64)
+
+    #stable, so the sets of each bucket stay in order of position
+    order = np.argsort(keys, kind='stable')
+    sortedKeys = keys[order]
+    a, b = [np.zeros(0, dtype=order.dtype)], [np.zeros(0, dtype=order.dtype)]
+    for offset in range(1, window + 1):
+        same = np.flatnonzero(sortedKeys[offset:] == sortedKeys[:-offset])
+        #no bucket holds more than offset sets
+        if not len(same):
+            break
+        a.append(order[same])
+        b.append(order[same + offset])
+    return np.concatenate(a), np.concatenate(b)
+
+
+def clusterLabels(numSets, a, b):
+    """
+    Joins linked sets into connected components.
+
+    :param a: Positions of one side of every link.
+    :param b: Positions of the other side of every link.
+    :return: Array with the lowest position in each set's component.
+    """
+    labels = np.arange(numSets)
+    while True:
+        np.minimum.at(labels, a, labels[b])
+        np.minimum.at(labels, b, labels[a])
+        #point every set straight at the lowest position it can reach
+        jumped = labels[labels]
+        while not np.array_equal(jumped, labels):
+            labels = jumped
+            jumped = labels[labels]
+        if np.array_equal(labels[a], labels[b]):
+            return labels
+
+
+def representativeLabels(signatures, components, threshold):
+    """
+    Splits components into clusters that are each within threshold of one set, so a
+    chain of sets that each differ a little from the last can't join sets that have
+    little in common. The sets of a component are visited in order of position and
+    join the most similar of its cluster representatives that they are near
+    duplicates of, or else become a representative themselves.
+
+    :param signatures: MinHash signatures of the sets.
+    :param components: Lowest position in each set's component, from clusterLabels.
+    :param threshold: Smallest estimated Jaccard similarity to a representative.
+    :return: Array with the position of each set's representative.
+    """
+    labels = np.arange(len(components))
+    representatives = {}
+    #the first set of each component is its first representative and is never visited
+    for position in np.flatnonzero(components != labels):
+        reps = representatives.setdefault(components[position], [components[position]])
+        similarity = (signatures[reps] == signatures[position]).mean(axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] >= threshold:
+            labels[position] = reps[best]
+        else:
+            reps.append(position)
+    return labels
+
+
+def nearDuplicates(recipes, threshold=0.8, numHashes=NUM_HASHES, bands=BANDS,
+                   minIngredients=MIN_INGREDIENTS, seed=0):
+    """
+    Groups recipes whose ingredient sets have about threshold Jaccard similarity or
+    more with the first recipe of their group. Recipes are only compared with the
+    recipes they share a band of MinHash values with (locality sensitive hashing),
+    and each of those pairs is checked with the share of MinHash values they have
+    in common, so the time taken grows linearly with the number of recipes instead
+    of with the number of pairs. Linked recipes are then split into groups around
+    representatives (see representativeLabels).
+
+    :param recipes: List of cleaned ingredient lists.
+    :param threshold: Smallest Jaccard similarity (0-1) of two near duplicates.
+    :param numHashes: Number of MinHash values per recipe (a multiple of bands).
+    :param bands: Number of bands the MinHash values are split into.
+    :param minIngredients: Fewest distinct ingredients a recipe needs to be checked.
+    :param seed: Random seed of the hash functions.
+    :return: Array with the row of the first recipe of each recipe's cluster. Recipes
+             that are not near duplicates of anything are their own cluster.
+    """
+    labels = np.arange(len(recipes))
+    rows, tokens, indptr, numTokens = tokenize(recipes, minIngredients)
+    if len(rows) < 2:
+        return labels
+    signatures = minhashSignatures(tokens, indptr, numTokens, numHashes, seed)
+    rowsPerBand = numHashes // bands
+
+    linkedA, linkedB = [], []
+    for band in range(bands):
+        a, b = bandPairs(signatures, band, rowsPerBand)
+        for start in range(0, len(a), CHUNK_SIZE):
+            pairA, pairB = a[start:start + CHUNK_SIZE], b[start:start + CHUNK_SIZE]
+            #share of MinHash values in common estimates the Jaccard similarity
+            similar = (signatures[pairA] == signatures[pairB]).mean(axis=1) >= threshold
+            linkedA.append(pairA[similar])
+            linkedB.append(pairB[similar])
+
+    components = clusterLabels(len(rows), np.concatenate(linkedA), np.concatenate(linkedB))
+    clusters = representativeLabels(signatures, components, threshold)
+    labels[rows] = rows[clusters]
+    return labels
@@ -0,0 +1,292 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeFeatures.py
+#   Purpose:    Turns recipes into tf-idf feature vectors,
+#               either by fitting a new vocabulary or by
+#               adding recipes to an existing one. Every cleaned
+#               ingredient is one feature, and title words are
+#               an optional, separately weighted block.
+#
+########################################################
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+#splits text into words the same way TfidfVectorizer does
+analyzer = TfidfVectorizer().build_analyzer()
+#splits titles into words and pairs of words
+titleAnalyzer = TfidfVectorizer(ngram_range=(1, 2)).build_analyzer()
+
+#title features are named with this in front so they never clash with an ingredient
+TITLE_PREFIX = "title:"
+
+#fields of a recipe's feature vector, in the order of their field ids
+FIELDS = ("ingredients", "title")
+
+#weights of each field, and the fewest recipes (count) and most recipes (share) a
+#feature may be in to be kept
+FEATURE_OPTIONS = {"weights": {"ingredients": 1.0, "title": 0.0}, "minDf": 2, "maxDf": 0.8}
+
+
+def addFeatureArguments(parser):
+    """
+    Adds the options that change how feature vectors are built to a program's argument parser.
+    """
+    parser.add_argument('--usetitle', '-t', action='store_true', help="Take into consideration the name of a recipe for recommendations.")
+    parser.add_argument('--titleweight', type=float, default=0.5, help="How much the words of a recipe's name count next to its ingredients with --usetitle.")
+    parser.add_argument('--ingredientweight', type=float, default=1.0, help="How much a recipe's ingredients count next to its name with --usetitle.")
+    parser.add_argument('--mindf', type=int, default=FEATURE_OPTIONS["minDf"], help="Leave out ingredients and title words found in fewer recipes than this.")
+    parser.add_argument('--maxdf', type=float, default=FEATURE_OPTIONS["maxDf"], help="Leave out ingredients and title words found in more than this share (0-1) of recipes.")
+
+
+def featureOptions(args):
+    """
+    :param args: Parsed arguments from a parser given to addFeatureArguments.
+    :return: Dictionary of the field weights and pruning limits to build feature vectors with.
+    """
+    return {"weights": {"ingredients": args.ingredientweight, "title": args.titleweight if args.usetitle else 0.0},
+            "minDf": args.mindf, "maxDf": args.maxdf}
+
+
+def usesTitles(options):
+    return options["weights"].get("title", 0) > 0
+
+
+def ingredientTerms(ingredients):
+    #each cleaned ingredient (e.g. 'olive oil') is one feature, counted once per recipe
+    return list(dict.fromkeys(ingredients))
+
+
+def titleTerms(title):
+    return [TITLE_PREFIX + gram for gram in titleAnalyzer(title)]
+
+
+def fieldIds(terms):
+    """
+    :param terms: Feature names, in column order.
+    :return: Id (position in FIELDS) of the field of every feature.
+    """
+    return np.char.startswith(np.asarray(terms, dtype=str), TITLE_PREFIX).astype(np.int64)
+
+
+def termCounts(docs, terms=(), addTerms=True):
+    """
+    :param docs: List of every recipe's features.
+    :param terms: Existing feature names, in column order.
+    :param addTerms: Add features not in terms to the end of them, instead of leaving them out.
+    :return: (counts, terms) with a sparse matrix of feature counts per recipe.
+    """
+    termIdx = {term: i for i, term in enumerate(terms)}
+    cols = []
+    indptr = np.zeros(len(docs) + 1, dtype=np.int64)
+    for row, doc in enumerate(docs):
+        if addTerms:
+            cols.extend(termIdx.setdefault(term, len(termIdx)) for term in doc)
+        else:
+            cols.extend(termIdx[term] for term in doc if term in termIdx)
+        indptr[row + 1] = len(cols)
+    counts = sp.csr_matrix((np.ones(len(cols), dtype=np.float32), np.asarray(cols, dtype=np.int64), indptr),
+                           shape=(len(docs), len(termIdx)))
+    counts.sum_duplicates()
+    return counts, list(termIdx)
+
+
+def weightFeatures(counts, idf, fields, weights):
+    """
+    Weights feature counts by idf, scales each field's part of every recipe's vector
+    to a length equal to the field's weight, and L2 normalizes the result. With the
+    fields in separate blocks of columns this is the same as normalizing each block,
+    weighting it and stacking the blocks side by side, so the similarity of two
+    recipes is a weighted average of the similarities of their fields.
+
+    :param counts: Sparse matrix of feature counts per recipe.
+    :param idf: Inverse document frequency weight of every feature.
+    :param fields: Field id of every feature, from fieldIds.
+    :param weights: Dictionary of the weight of each field.
+    :return: float32 CSR matrix with one L2 normalized row per recipe.
+    """
+    counts = sp.csr_matrix(counts)
+    fieldWeights = np.asarray([weights.get(field, 0.0) for field in FIELDS], dtype=np.float32)
+    data = counts.data.astype(np.float32) * np.asarray(idf, dtype=np.float32)[counts.indices]
+
+    #length of each field's part of every row
+    entryRow = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    entryField = np.asarray(fields, dtype=np.int64)[counts.indices]
+    key = entryRow * len(FIELDS) + entryField
+    lengths = np.sqrt(np.bincount(key, weights=data.astype(np.float64) ** 2, minlength=counts.shape[0] * len(FIELDS)))
+    data *= fieldWeights[entryField] / lengths[key].astype(np.float32)
+
+    #then the length of every row (rows without any features are left empty)
+    lengths = np.sqrt(np.bincount(entryRow, weights=data.astype(np.float64) ** 2, minlength=counts.shape[0]))
+    data /= np.where(lengths > 0, lengths, 1)[entryRow].astype(np.float32)
+
+    featureVector = sp.csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+    featureVector.eliminate_zeros()
+    return featureVector
+
+
+def fitCounts(counts, terms, options):
+    """
+    Leaves out the features in too few or too many recipes and weights the rest.
+
+    :param counts: Sparse matrix of feature counts per recipe.
+    :param terms: Feature names, in column order of counts.
+    :param options: Field weights and pruning limits, from featureOptions.
+    :return: (featureVector, terms, idf)
+    """
+    numDocs = counts.shape[0]
+    df = documentFrequency(counts)
+    keep = np.flatnonzero((df >= options["minDf"]) & (df <= options["maxDf"] * numDocs))
+
+    counts = sp.csr_matrix(counts)[:, keep]
+    terms = [terms[i] for i in keep]
+    idf = smoothIdf(df[keep], numDocs)
+    return weightFeatures(counts, idf, fieldIds(terms), options["weights"]), terms, idf
+
+
+def fitFeatures(recipes, titles=None, options=FEATURE_OPTIONS):
+    """
+    :param recipes: List of every recipe's cleaned ingredients.
+    :param titles: List of recipe titles, if titles are used for recommendations.
+    :param options: Field weights and pruning limits, from featureOptions.
+    :return: (featureVector, terms, idf)
+    """
+    counts, terms = termCounts([ingredientTerms(recipe) for recipe in recipes])
+    if titles is not None and usesTitles(options):
+        #title words get their own block of columns after the ingredients
+        titleCounts, titleNames = termCounts([titleTerms(title) for title in titles])
+        counts = sp.hstack([counts, titleCounts], format='csr')
+        terms += titleNames
+    return fitCounts(counts, terms, options)
+
+
+def columnarFeatures(recipeSheet, options=FEATURE_OPTIONS):
+    """
+    Builds the same feature vectors as fitFeatures straight from a columnar
+    dataset's ingredient ids, which already are a count matrix of its ingredients.
+
+    :param recipeSheet: ColumnarRecipes loaded from a .npz dataset.
+    :param options: Field weights and pruning limits, from featureOptions.
+    :return: (featureVector, terms, idf)
+    """
+    #copied, since summing duplicates works in place and the dataset's ingredient ids are still needed
+    counts = sp.csr_matrix(recipeSheet.countMatrix(), dtype=np.float32, copy=True)
+    #an ingredient listed twice in a recipe is still one feature
+    counts.sum_duplicates()
+    counts.data[:] = 1
+    terms = [str(ingredient) for ingredient in recipeSheet.vocabulary]
+    if usesTitles(options):
+        titleCounts, titleNames = termCounts([titleTerms(title) for title in recipeSheet.titles])
+        counts = sp.hstack([counts, titleCounts], format='csr')
+        terms += titleNames
+    return fitCounts(counts, terms, options)
+
+
+def documentFrequency(featureVector):
+    """
+    :param featureVector: Sparse matrix of recipe feature vectors.
+    :return: Number of recipes containing each feature.
+    """
+    featureVector = sp.csr_matrix(featureVector)
+    return np.bincount(featureVector.indices, minlength=featureVector.shape[1]).astype(np.int64)
+
+
+def smoothIdf(df, numDocs):
+    #same smoothed idf TfidfVectorizer uses by default
+    return np.log((1 + numDocs) / (1 + np.asarray(df, dtype=np.float64))) + 1
+
+
+def extendFeatures(recipes, titles, terms, df, numDocs, options=FEATURE_OPTIONS):
+    """
+    Builds feature vectors for new recipes using an existing vocabulary. Features
+    that are not in the vocabulary are left out, the same as the features the
+    vocabulary was pruned of when it was fitted, and document frequencies are
+    updated to include the new recipes.
+
+    :param recipes: List of the new recipes' cleaned ingredients.
+    :param titles: List of the new recipes' titles, if titles are used for recommendations.
+    :param terms: Existing feature names, in column order.
+    :param df: Existing document frequency of every feature.
+    :param numDocs: Number of recipes df was counted over.
+    :param options: Field weights the existing feature vectors were built with.
+    :return: (featureVector, terms, df, idf) where the feature vectors of the new
+             recipes use the updated idf weights.
+    """
+    docs = []
+    for row, recipe in enumerate(recipes):
+        doc = ingredientTerms(recipe)
+        if titles is not None and usesTitles(options):
+            doc += titleTerms(titles[row])
+        docs.append(doc)
+    counts, terms = termCounts(docs, terms, addTerms=False)
+
+    df = np.asarray(df, dtype=np.int64) + documentFrequency(counts)
+    idf = smoothIdf(df, numDocs + len(recipes))
+    return weightFeatures(counts, idf, fieldIds(terms), options["weights"]), terms, df, idf
+
+
+class QueryVectorizer:
+    """
+    Turns lists of ingredients into feature vectors using an already fitted
+    vocabulary and idf weights. An ingredient that is not a feature itself stands
+    for every ingredient feature containing all of its words (e.g. 'chicken' for
+    'chicken breast' and 'chicken thigh'). Anything else is ignored.
+    """
+
+    def __init__(self, terms, idf):
+        """
+        :param terms: Feature names, in column order of the feature vectors.
+        :param idf: Inverse document frequency weight of every feature.
+        """
+        self.termIdx = {str(term): i for i, term in enumerate(terms)}
+        self.idf = np.asarray(idf, dtype=np.float64)
+        #ingredient features containing each word, built on first use
+        self.wordIdx = None
+
+    def containing(self, ingredient):
+        """
+        :param ingredient: Ingredient name, possibly of several words.
+        :return: Columns of every ingredient feature containing all of its words.
+        """
+        if self.wordIdx is None:
+            self.wordIdx = {}
+            for term, col in self.termIdx.items():
+                if not term.startswith(TITLE_PREFIX):
+                    for word in set(analyzer(term)):
+                        self.wordIdx.setdefault(word, []).append(col)
+        cols = None
+        for word in analyzer(ingredient):
+            wordCols = self.wordIdx.get(word, [])
+            cols = set(wordCols) if cols is None else cols.intersection(wordCols)
+        return sorted(cols) if cols else []
+
+    def columns(self, ingredient):
+        """
+        :return: Columns an ingredient of a query stands for.
+        """
+        col = self.termIdx.get(ingredient)
+        return [col] if col is not None else self.containing(ingredient)
+
+    def transform(self, queries):
+        """
+        :param queries: List of queries, each a list of ingredients.
+        :return: Sparse matrix with one L2 normalized row per query.
+        """
+        rows = []
+        cols = []
+        for row, ingredients in enumerate(queries):
+            for ingredient in ingredients:
+                ingredientCols = self.columns(ingredient)
+                rows.extend([row] * len(ingredientCols))
+                cols.extend(ingredientCols)
+        counts = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(queries), len(self.idf)))
+        counts.data[:] = 1
+        return sp.csr_matrix(normalize(counts @ sp.diags(self.idf)))
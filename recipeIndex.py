@@ -0,0 +1,446 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeIndex.py
+#   Purpose:    Saves the fitted recommender (vocabulary, idf
+#               weights, feature vectors, neighbour lists and
+#               recipe information) to disk and memory-maps it back
+#               so the recommender does not refit on every run.
+#               Recipes can be added to or removed from a saved
+#               index without refitting all of it.
+#
+########################################################
+
+import os
+import json
+import shutil
+import numpy as np
+import scipy.sparse as sp
+from recipeFeatures import fitFeatures, documentFrequency, smoothIdf, extendFeatures, usesTitles, FEATURE_OPTIONS
+from recipeSimilarity import SimilarityEngine, topK
+from recipeStore import RecipeStore
+
+INDEX_VERSION = 4
+
+
+def _saveArray(indexDir, name, array):
+    np.save(os.path.join(indexDir, name + ".npy"), array, allow_pickle=False)
+
+
+def _loadArray(indexDir, name):
+    return np.load(os.path.join(indexDir, name + ".npy"), mmap_mode='r', allow_pickle=False)
+
+
+def _indexType(size):
+    #keep scipy from copying the arrays into a wider type when they are loaded
+    return np.int32 if size < np.iinfo(np.int32).max else np.int64
+
+
+def encodeStrings(strings):
+    """
+    Packs a list of strings into one utf-8 byte blob with an offsets array so it
+    can be saved and memory-mapped without pickling.
+
+    :param strings: List of strings.
+    :return: (blob, offsets) where string i is blob[offsets[i]:offsets[i+1]].
+    """
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def decodeString(blob, offsets, i):
+    return bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+
+def decodeStrings(blob, offsets):
+    """
+    :return: List of every string packed by encodeStrings.
+    """
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def _matrixArrays(name, matrix):
+    indexType = _indexType(max(matrix.nnz, max(matrix.shape)))
+    return {name + "_data": matrix.data.astype(np.float32, copy=False),
+            name + "_indices": matrix.indices.astype(indexType, copy=False),
+            name + "_indptr": matrix.indptr.astype(indexType, copy=False)}
+
+
+def _titleOrder(titles):
+    return np.asarray(sorted(range(len(titles)), key=lambda i: titles[i].encode('utf-8')), dtype=np.int32)
+
+
+def _recipeArrays(store):
+    #titles are stored in a blob along with their sorted order so a title can be
+    #found with a binary search without building a dictionary at startup
+    titles = store.titles
+    titleBlob, titleOffsets = encodeStrings(titles)
+    linkBlob, linkOffsets = encodeStrings(store.links)
+
+    #ingredients are stored one string each, with every recipe owning a run of them
+    ingredients = store.ingredients
+    blob, offsets = encodeStrings([ing for recipe in ingredients for ing in recipe])
+    recipeOffsets = np.zeros(len(ingredients) + 1, dtype=np.int64)
+    np.cumsum([len(recipe) for recipe in ingredients], out=recipeOffsets[1:])
+
+    return {"title_blob": titleBlob, "title_offsets": titleOffsets, "title_order": _titleOrder(titles),
+            "link_blob": linkBlob, "link_offsets": linkOffsets,
+            "ingredient_blob": blob, "ingredient_offsets": offsets,
+            "recipe_ingredient_offsets": recipeOffsets}
+
+
+def _inMemory(arrays):
+    """
+    :param arrays: Dictionary of arrays, some of them memory-mapped from an index.
+    :return: Dictionary of copies of the arrays that do not use the index files.
+    """
+    return {name: np.array(array) for name, array in arrays.items()}
+
+
+def _writeIndex(indexDir, arrays, info):
+    """
+    Writes every array of an index into a temporary directory and then swaps it
+    into place, so a failed update never leaves a half-written index behind.
+    None of the arrays may be memory-mapped from indexDir, and any RecipeIndex
+    loaded from it has to be let go of first: Windows will not rename a
+    directory while files inside of it are mapped.
+    """
+    tmpDir = indexDir + ".tmp"
+    shutil.rmtree(tmpDir, ignore_errors=True)
+    os.makedirs(tmpDir)
+    for name, array in arrays.items():
+        _saveArray(tmpDir, name, array)
+    with open(os.path.join(tmpDir, "meta.json"), 'w') as f:
+        json.dump(info, f, indent=2)
+
+    if os.path.exists(indexDir):
+        oldDir = indexDir + ".old"
+        shutil.rmtree(oldDir, ignore_errors=True)
+        os.rename(indexDir, oldDir)
+        os.rename(tmpDir, indexDir)
+        shutil.rmtree(oldDir, ignore_errors=True)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(indexDir)), exist_ok=True)
+        os.rename(tmpDir, indexDir)
+
+
+def _indexInfo(meta, numRecipes, numFeatures, numRemoved, neighbours):
+    info = dict(meta or {})
+    info.update({"version": INDEX_VERSION,
+                 "numRecipes": int(numRecipes),
+                 "numFeatures": int(numFeatures),
+                 "numRemoved": int(numRemoved),
+                 "neighbours": int(neighbours)})
+    return info
+
+
+def saveIndex(indexDir, terms, idf, featureVector, neighbourIdx, neighbourSim, store, meta=None):
+    """
+    Writes a recommender index to a directory of .npy files.
+
+    :param indexDir: Directory to write the index into (replaced if it exists).
+    :param terms: Feature names, in column order of the feature vectors.
+    :param idf: Inverse document frequency weight of every feature.
+    :param featureVector: Sparse matrix with one L2 normalized row per recipe.
+    :param neighbourIdx: (N, k) array of the most similar recipes for each recipe.
+    :param neighbourSim: (N, k) array of the matching similarity scores.
+    :param store: RecipeStore with the title, link and ingredients of every recipe.
+    :param meta: Extra information to keep with the index (e.g. the source file). Its
+                 "features" entry holds the options the feature vectors were built with.
+    """
+    features = sp.csr_matrix(featureVector)
+    arrays = {"terms": np.asarray(terms, dtype=str),
+              "idf": np.asarray(idf, dtype=np.float32),
+              #document frequencies let recipes be added later without refitting
+              "df": documentFrequency(features),
+              "removed": np.zeros(features.shape[0], dtype=bool)}
+    arrays.update(_matrixArrays("features", features))
+    arrays.update(_matrixArrays("featuresT", features.T.tocsr()))
+    arrays["neighbourIdx"] = np.asarray(neighbourIdx, dtype=np.int32)
+    arrays["neighbourSim"] = np.asarray(neighbourSim, dtype=np.float32)
+    arrays.update(_recipeArrays(store))
+
+    _writeIndex(indexDir, arrays,
+                _indexInfo(meta, features.shape[0], features.shape[1], 0, np.shape(neighbourIdx)[1]))
+
+
+class RecipeIndex:
+    """
+    Recommender index loaded from disk. Every array is memory-mapped, so loading
+    an index only reads the small metadata file and the pages touched by queries.
+    """
+
+    def __init__(self, indexDir):
+        with open(os.path.join(indexDir, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError("Index \"" + indexDir + "\" was built by a different version. Rebuild it.")
+
+        shape = (self.meta["numRecipes"], self.meta["numFeatures"])
+        self.indexDir = indexDir
+        self.terms = _loadArray(indexDir, "terms")
+        self.idf = _loadArray(indexDir, "idf")
+        self.df = _loadArray(indexDir, "df")
+        self.removed = _loadArray(indexDir, "removed")
+        self.features = sp.csr_matrix((_loadArray(indexDir, "features_data"),
+                                       _loadArray(indexDir, "features_indices"),
+                                       _loadArray(indexDir, "features_indptr")), shape=shape, copy=False)
+        self.featuresT = sp.csr_matrix((_loadArray(indexDir, "featuresT_data"),
+                                        _loadArray(indexDir, "featuresT_indices"),
+                                        _loadArray(indexDir, "featuresT_indptr")), shape=shape[::-1], copy=False)
+        self.neighbourIdx = _loadArray(indexDir, "neighbourIdx")
+        self.neighbourSim = _loadArray(indexDir, "neighbourSim")
+        self.titleBlob = _loadArray(indexDir, "title_blob")
+        self.titleOffsets = _loadArray(indexDir, "title_offsets")
+        self.titleOrder = _loadArray(indexDir, "title_order")
+        self.linkBlob = _loadArray(indexDir, "link_blob")
+        self.linkOffsets = _loadArray(indexDir, "link_offsets")
+        self.ingredientBlob = _loadArray(indexDir, "ingredient_blob")
+        self.ingredientOffsets = _loadArray(indexDir, "ingredient_offsets")
+        self.recipeIngredientOffsets = _loadArray(indexDir, "recipe_ingredient_offsets")
+
+    def __len__(self):
+        return self.meta["numRecipes"]
+
+    @property
+    def numRemoved(self):
+        return self.meta.get("numRemoved", 0)
+
+    def arrays(self):
+        """
+        :return: Dictionary of every array in the index, keyed by file name.
+        """
+        return {name[:-len(".npy")]: _loadArray(self.indexDir, name[:-len(".npy")])
+                for name in os.listdir(self.indexDir) if name.endswith(".npy")}
+
+    def title(self, row):
+        return decodeString(self.titleBlob, self.titleOffsets, row)
+
+    def link(self, row):
+        return decodeString(self.linkBlob, self.linkOffsets, row)
+
+    def ingredients(self, row):
+        start, end = self.recipeIngredientOffsets[row], self.recipeIngredientOffsets[row + 1]
+        return tuple(decodeString(self.ingredientBlob, self.ingredientOffsets, i) for i in range(start, end))
+
+    def findTitle(self, title):
+        """
+        Looks up a recipe by its exact title.
+
+        :param title: Title to find.
+        :return: Row of the recipe, or -1 if no recipe has that title.
+        """
+        key = title.encode('utf-8')
+        lo, hi = 0, len(self.titleOrder)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = self.titleOrder[mid]
+            if bytes(self.titleBlob[self.titleOffsets[row]:self.titleOffsets[row + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        #skip over removed recipes that share the title
+        while lo < len(self.titleOrder) and self.title(self.titleOrder[lo]) == title:
+            if not self.removed[self.titleOrder[lo]]:
+                return int(self.titleOrder[lo])
+            lo += 1
+        return -1
+
+    @property
+    def featureOptions(self):
+        """
+        :return: Field weights and pruning limits the feature vectors were built with.
+        """
+        return self.meta.get("features", FEATURE_OPTIONS)
+
+    def neighbours(self, row):
+        """
+        :param row: Row of the recipe.
+        :return: List of (row, similarity) pairs from the precomputed neighbour list.
+        """
+        valid = self.neighbourIdx[row] >= 0
+        return list(zip(self.neighbourIdx[row][valid].tolist(), self.neighbourSim[row][valid].tolist()))
+
+
+def loadIndex(indexDir):
+    return RecipeIndex(indexDir)
+
+
+def _mergeNeighbours(neighbourIdx, neighbourSim, rows, candidates, scores):
+    """
+    Merges new candidates into existing neighbour lists, keeping the k best.
+
+    :param rows: Row of the neighbour list each candidate belongs to.
+    :param candidates: Candidate neighbour of each row.
+    :param scores: Similarity of each candidate.
+    """
+    k = neighbourIdx.shape[1]
+    order = np.argsort(rows, kind='stable')
+    rows, candidates, scores = rows[order], candidates[order], scores[order]
+    uniqueRows, starts = np.unique(rows, return_index=True)
+    ends = np.append(starts[1:], len(rows))
+    for row, start, end in zip(uniqueRows, starts, ends):
+        valid = neighbourIdx[row] >= 0
+        idx = np.concatenate([neighbourIdx[row][valid], candidates[start:end]])
+        sims = np.concatenate([neighbourSim[row][valid], scores[start:end]])
+        top = topK(sims, k)
+        neighbourIdx[row] = -1
+        neighbourSim[row] = 0
+        neighbourIdx[row, :len(top)] = idx[top]
+        neighbourSim[row, :len(top)] = sims[top]
+
+
+def appendRecipes(indexDir, store, blockSize=1024):
+    """
+    Adds recipes to a saved index without refitting the recipes already in it.
+    New recipes are weighted with idf values updated to include them, features
+    that are not in the vocabulary are left out, and existing neighbour lists pick up
+    any new recipe that is more similar than their current k-th neighbour. The
+    recipes already in the index keep the weights they were fitted with until the
+    index is compacted.
+
+    :param indexDir: Directory of the index to update.
+    :param store: RecipeStore with the recipes to add.
+    :param blockSize: Number of recipes to compare at a time.
+    :return: RecipeIndex loaded from the updated directory.
+    """
+    index = loadIndex(indexDir)
+    options = index.featureOptions
+    numOld, numNew = len(index), len(store)
+    newFeatures, terms, df, idf = extendFeatures(store.ingredients, store.titles,
+                                                 index.terms.tolist(), index.df, numOld - index.numRemoved,
+                                                 options)
+
+    #old rows are unchanged
+    oldFeatures = sp.csr_matrix((index.features.data, index.features.indices, index.features.indptr),
+                                shape=(numOld, len(terms)))
+    features = sp.vstack([oldFeatures, newFeatures], format='csr')
+    removed = np.concatenate([index.removed, np.zeros(numNew, dtype=bool)])
+    engine = SimilarityEngine(features, removed=removed)
+
+    k = index.neighbourIdx.shape[1]
+    newRows = np.arange(numOld, numOld + numNew)
+    newIdx, newSim = engine.neighbours(k, blockSize, rows=newRows)
+    neighbourIdx = np.vstack([index.neighbourIdx, newIdx])
+    neighbourSim = np.vstack([index.neighbourSim, newSim])
+
+    #similarity is symmetric, so comparing the new recipes against everything also
+    #finds the old recipes that should have a new recipe as a neighbour
+    if k and numOld and numNew:
+        #lists that are not full take any candidate
+        threshold = np.where(neighbourIdx[:numOld, -1] >= 0, neighbourSim[:numOld, -1], -np.inf)
+        rows, candidates, scores = [], [], []
+        for start in range(0, numNew, blockSize):
+            block = (features[newRows[start:start + blockSize]] @ engine.featuresT).tocoo()
+            keep = block.col < numOld
+            keep[keep] = (block.data[keep] > threshold[block.col[keep]]) & ~removed[block.col[keep]]
+            rows.append(block.col[keep])
+            candidates.append(newRows[start + block.row[keep]])
+            scores.append(block.data[keep])
+        _mergeNeighbours(neighbourIdx, neighbourSim, np.concatenate(rows),
+                         np.concatenate(candidates), np.concatenate(scores))
+
+    arrays = _inMemory(index.arrays())
+    arrays.update({"terms": np.asarray(terms, dtype=str),
+                   "idf": np.asarray(idf, dtype=np.float32),
+                   "df": df,
+                   "removed": removed,
+                   "neighbourIdx": neighbourIdx,
+                   "neighbourSim": neighbourSim})
+    arrays.update(_matrixArrays("features", features))
+    arrays.update(_matrixArrays("featuresT", engine.featuresT))
+
+    info = _indexInfo(index.meta, features.shape[0], len(terms), index.numRemoved, k)
+    numIngredients = len(index.ingredientOffsets) - 1
+    #close the memory maps so the directory can be replaced
+    del index, oldFeatures
+
+    #new strings are appended to the existing blobs instead of re-encoding them
+    added = _recipeArrays(store)
+    for name, offsetName in (("title_blob", "title_offsets"), ("link_blob", "link_offsets"),
+                             ("ingredient_blob", "ingredient_offsets"),
+                             (None, "recipe_ingredient_offsets")):
+        if name is not None:
+            arrays[name] = np.concatenate([arrays[name], added[name]])
+        base = numIngredients if name is None else arrays[offsetName][-1]
+        arrays[offsetName] = np.concatenate([arrays[offsetName], added[offsetName][1:] + base])
+    titles = decodeStrings(arrays["title_blob"], arrays["title_offsets"])
+    arrays["title_order"] = _titleOrder(titles)
+
+    _writeIndex(indexDir, arrays, info)
+    return loadIndex(indexDir)
+
+
+def removeRecipes(indexDir, rows, blockSize=1024):
+    """
+    Removes recipes from a saved index. Removed recipes stay in the index files
+    but are never returned again, and any neighbour list that contained one is
+    recomputed. Run compactIndex to drop them from the files.
+
+    :param indexDir: Directory of the index to update.
+    :param rows: Rows of the recipes to remove.
+    :param blockSize: Number of recipes to compare at a time.
+    :return: RecipeIndex loaded from the updated directory.
+    """
+    index = loadIndex(indexDir)
+    removed = np.array(index.removed)
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    rows = rows[~removed[rows]]
+    removed[rows] = True
+    numRemoved = index.numRemoved + len(rows)
+
+    df = index.df - documentFrequency(index.features[rows])
+    idf = smoothIdf(df, len(index) - numRemoved)
+
+    engine = SimilarityEngine(index.features, index.featuresT, removed)
+    neighbourIdx = np.array(index.neighbourIdx)
+    neighbourSim = np.array(index.neighbourSim)
+    affected = np.flatnonzero(np.isin(neighbourIdx, rows).any(axis=1) & ~removed)
+    neighbourIdx[affected], neighbourSim[affected] = engine.neighbours(neighbourIdx.shape[1], blockSize,
+                                                                       rows=affected)
+
+    arrays = _inMemory(index.arrays())
+    arrays.update({"idf": np.asarray(idf, dtype=np.float32),
+                   "df": df,
+                   "removed": removed,
+                   "neighbourIdx": neighbourIdx,
+                   "neighbourSim": neighbourSim})
+    info = _indexInfo(index.meta, len(index), index.meta["numFeatures"], numRemoved, neighbourIdx.shape[1])
+    #close the memory maps so the directory can be replaced
+    del index, engine
+    _writeIndex(indexDir, arrays, info)
+    return loadIndex(indexDir)
+
+
+def compactIndex(indexDir, blockSize=1024):
+    """
+    Rebuilds an index from the recipes that have not been removed, refitting the
+    vocabulary and idf weights so every recipe is weighted the same way again.
+
+    :param indexDir: Directory of the index to rebuild.
+    :param blockSize: Number of recipes to compare at a time.
+    :return: RecipeIndex loaded from the rebuilt directory.
+    """
+    index = loadIndex(indexDir)
+    options = index.featureOptions
+    rows = np.flatnonzero(~np.asarray(index.removed)).tolist()
+    store = RecipeStore([index.title(row) for row in rows],
+                        [index.link(row) for row in rows],
+                        [index.ingredients(row) for row in rows])
+    featureVector, terms, idf = fitFeatures(store.ingredients, store.titles if usesTitles(options) else None, options)
+    neighbourIdx, neighbourSim = SimilarityEngine(featureVector).neighbours(index.neighbourIdx.shape[1], blockSize)
+    meta = dict(index.meta, features=options)
+    #close the memory maps so the directory can be replaced
+    del index
+    saveIndex(indexDir, terms, idf, featureVector, neighbourIdx, neighbourSim, store, meta)
+    return loadIndex(indexDir)
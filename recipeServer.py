@@ -0,0 +1,328 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeServer.py
+#   Purpose:    Serves recommendations over HTTP from a model
+#               that is loaded once, answering requests that
+#               arrive together with a single matrix product.
+#
+########################################################
+
+import json
+import time
+import queue
+import argparse
+import threading
+import collections
+import numpy as np
+import scipy.sparse as sp
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from recipeSimilarity import topK
+from pantrySearch import PantrySearch, splitIngredients
+from recipeFeatures import addFeatureArguments
+from cosFoodRec import loadEngine
+import instrument
+
+#largest number of recommendations a single request may ask for
+MAX_K = 100
+
+#number of recent request latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+
+
+class BatchScorer:
+    """
+    Collects queries from many request threads and scores them together. A
+    background thread waits for the first query, takes every query already
+    waiting behind it, and keeps collecting more for up to maxWait seconds (or
+    until maxBatch have arrived) only if others were waiting, so a lone query is
+    scored straight away. The whole batch is answered with one sparse product
+    against the transposed feature vectors.
+    """
+
+    def __init__(self, engine, maxBatch=64, maxWait=0.001):
+        """
+        :param engine: SimilarityEngine to score queries against.
+        :param maxBatch: Most queries scored together.
+        :param maxWait: Longest time (in seconds) the first query of a batch waits for others.
+        """
+        self.engine = engine
+        self.maxBatch = maxBatch
+        self.maxWait = maxWait
+        self.queries = queue.Queue()
+        self.batches = 0
+        self.scored = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, vector, k, exclude=-1):
+        """
+        :param vector: Sparse 1 x M query vector.
+        :param k: Number of recipes to return.
+        :param exclude: Row to leave out of the results (e.g. the recipe being queried).
+        :return: Future holding a list of (row, similarity) pairs, most similar first.
+        """
+        future = Future()
+        self.queries.put((vector, k, exclude, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.queries.get()]
+            if self.maxBatch > 1:
+                try:
+                    batch.append(self.queries.get_nowait())
+                except queue.Empty:
+                    #nothing else is waiting, so waiting for company would only add latency
+                    pass
+            deadline = time.perf_counter() + self.maxWait
+            while 1 < len(batch) < self.maxBatch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    batch.append(self.queries.get(timeout=timeout) if timeout > 0 else self.queries.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.score(batch)
+            except Exception as e:
+                for vector, k, exclude, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def score(self, batch):
+        vectors = sp.vstack([vector for vector, k, exclude, future in batch], format='csr')
+        scores = (vectors @ self.engine.featuresT).tocsr()
+        removed = self.engine.removed
+        for i, (vector, k, exclude, future) in enumerate(batch):
+            cols = scores.indices[scores.indptr[i]:scores.indptr[i + 1]]
+            vals = scores.data[scores.indptr[i]:scores.indptr[i + 1]]
+            keep = cols != exclude
+            if removed is not None:
+                keep &= ~removed[cols]
+            cols, vals = cols[keep], vals[keep]
+            top = topK(vals, k)
+            future.set_result(list(zip(cols[top].tolist(), vals[top].tolist())))
+        self.batches += 1
+        self.scored += len(batch)
+
+
+class LatencyStats:
+    """
+    Keeps the latencies of the most recent requests for reporting percentiles.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, ms, error=False):
+        with self.lock:
+            self.latencies.append(ms)
+            self.requests += 1
+            self.errors += error
+
+    def summary(self):
+        with self.lock:
+            latencies = np.asarray(self.latencies)
+            summary = {"requests": self.requests, "errors": self.errors,
+                       "qps": self.requests / (time.perf_counter() - self.started)}
+        if len(latencies):
+            for p in (50, 90, 99):
+                summary["p" + str(p) + "Ms"] = float(np.percentile(latencies, p))
+            summary["maxMs"] = float(latencies.max())
+        return summary
+
+
+class RecipeServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the loaded recipes and similarity engine, shared by every
+    request handler thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, store, engine, terms, idf, maxBatch=64, maxWait=0.001):
+        super().__init__(address, RecipeHandler)
+        self.store = store
+        self.engine = engine
+        self.pantry = PantrySearch(engine, terms, idf)
+        #built up front so the first misspelled title doesn't wait for it
+        self.titles = store.titleIndex()
+        self.scorer = BatchScorer(engine, maxBatch, maxWait)
+        self.stats = LatencyStats()
+
+
+class RequestError(Exception):
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class RecipeHandler(BaseHTTPRequestHandler):
+    #keep connections open between requests
+    protocol_version = "HTTP/1.1"
+    #headers and body are written separately, so don't let them wait on each other
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        #printing every request would cost more than answering it
+        return
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.handle_query(url.path, {key: values[-1] for key, values in parse_qs(url.query).items()})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            #the body can't be found, so the connection can't be reused either
+            self.close_connection = True
+            self.send_json(400, {"error": "Content-Length must be a number of bytes."})
+            return
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            params = None
+        if not isinstance(params, dict):
+            self.send_json(400, {"error": "Request body must be a json object."})
+            return
+        self.handle_query(url.path, params)
+
+    def handle_query(self, path, params):
+        start = time.perf_counter()
+        try:
+            if path == "/similar":
+                status, body = 200, self.similar(params)
+            elif path == "/similar_by_ingredients":
+                status, body = 200, self.similar_by_ingredients(params)
+            elif path == "/complete":
+                status, body = 200, self.complete(params)
+            elif path == "/stats":
+                status, body = 200, self.server.stats.summary()
+                body.update({"batches": self.server.scorer.batches,
+                             "meanBatch": self.server.scorer.scored / max(self.server.scorer.batches, 1)})
+            else:
+                status, body = 404, {"error": "Unknown path " + path}
+        except RequestError as e:
+            status, body = e.status, dict(e.details, error=str(e))
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+        self.send_json(status, body)
+        if path != "/stats":
+            self.server.stats.add(1000 * (time.perf_counter() - start), status >= 400)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def getK(self, params, name='k'):
+        try:
+            k = int(params.get(name, 10))
+        except (TypeError, ValueError):
+            raise RequestError(400, name + " must be a number.")
+        return max(1, min(k, MAX_K))
+
+    def results(self, future):
+        return self.recipes(future.result())
+
+    def recipes(self, pairs):
+        results = []
+        for row, score in pairs:
+            recipe = self.server.store[row]
+            results.append({"row": row, "title": recipe.title, "link": recipe.link, "score": score})
+        return results
+
+    def similar(self, params):
+        title = params.get('title')
+        if not title:
+            raise RequestError(400, "Missing title.")
+        row = self.server.store.findTitle(title)
+        if row < 0:
+            raise RequestError(404, "No recipe titled \"" + title + "\".",
+                               suggestions=self.server.titles.closeMatches(title, 3, cutoff=0.5))
+        k = self.getK(params)
+        #an index's precomputed neighbour lists answer most requests without scoring
+        stored = self.server.engine.storedNeighbours([row], k)
+        if stored is not None:
+            indices, scores = stored
+            valid = indices[0] >= 0
+            return {"title": title, "row": row,
+                    "results": self.recipes(zip(indices[0][valid].tolist(), scores[0][valid].tolist()))}
+        future = self.server.scorer.submit(self.server.engine.features[row], k, exclude=row)
+        return {"title": title, "row": row, "results": self.results(future)}
+
+    def complete(self, params):
+        prefix = params.get('prefix')
+        if not prefix:
+            raise RequestError(400, "Missing prefix.")
+        return {"prefix": prefix, "titles": self.server.titles.complete(prefix, self.getK(params, 'n'))}
+
+    def ingredientList(self, params, name):
+        ingredients = params.get(name) or []
+        if isinstance(ingredients, str):
+            return splitIngredients(ingredients)
+        return [str(ingredient).strip().lower() for ingredient in ingredients if str(ingredient).strip()]
+
+    def similar_by_ingredients(self, params):
+        ingredients = self.ingredientList(params, 'ingredients')
+        include = self.ingredientList(params, 'include')
+        exclude = self.ingredientList(params, 'exclude')
+        if not ingredients and not include:
+            raise RequestError(400, "Missing ingredients.")
+        #answered straight from the inverted index, so it is not batched
+        results = self.server.pantry.search(ingredients, self.getK(params), include, exclude)
+        return {"ingredients": ingredients, "include": include, "exclude": exclude,
+                "results": self.recipes(results)}
+
+
+def main():
+    #CLA argument definitions
+    parser = argparse.ArgumentParser("Serve recipe recommendations over HTTP.\n")
+    parser.add_argument('--datafile', '-f', type=str, help="File containing cleaned recipe data.")
+    addFeatureArguments(parser)
+    parser.add_argument('--index', '-i', type=str, help="Load a prebuilt recommender index instead of refitting the data.")
+    parser.add_argument('--host', type=str, default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument('--port', '-p', type=int, default=8080, help="Port to listen on.")
+    parser.add_argument('--batch', type=int, default=64, help="Most requests scored together.")
+    parser.add_argument('--wait', type=float, default=1.0, help="Longest time (in ms) a request waits for others to be scored with.")
+    instrument.addArguments(parser)
+    args = parser.parse_args()
+    instrument.start(args, "recipeServer")
+    if not args.index and not args.datafile:
+        parser.error("--datafile is required unless an --index is given.")
+
+    print("Loading data...", end='', flush=True)
+    with instrument.stage("load"):
+        store, engine, terms, idf = loadEngine(args)
+        server = RecipeServer((args.host, args.port), store, engine, terms, idf, args.batch, args.wait / 1000)
+    print("done.\nServing", len(store), "recipes on http://" + args.host + ":" + str(args.port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    instrument.counters.update(requests=server.stats.requests, errors=server.stats.errors,
+                               batches=server.scorer.batches)
+    print("\n" + json.dumps(server.stats.summary()))
+    return
+
+
+if __name__ == "__main__":
+    main()
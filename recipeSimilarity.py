@@ -0,0 +1,249 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeSimilarity.py
+#   Purpose:    Computes cosine similarity between recipes on
+#               demand from the sparse feature vectors instead
+#               of keeping a full N x N similarity matrix.
+#
+########################################################
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def topK(scores, k):
+    """
+    Selects the k highest scores without sorting the whole array.
+
+    :param scores: Array of similarity scores.
+    :param k: Number of scores to select.
+    :return: Positions of the k highest scores, highest first.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class RankedResults:
+    """
+    Recipes ordered from most to least similar, selected a block at a time. Only
+    the first block is ranked up front; later blocks are selected the first time
+    something asks for a position past the ones already ranked.
+    """
+
+    def __init__(self, scores, blockSize=50, size=None):
+        """
+        :param scores: Array of similarity scores, one per recipe.
+        :param blockSize: Number of recipes ranked each time more are needed.
+        :param size: Number of recipes that can be returned (defaults to all of them).
+        """
+        self.scores = scores
+        self.blockSize = blockSize
+        self.size = len(scores) if size is None else size
+        self.rows = topK(scores, min(blockSize, self.size))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if i >= self.size:
+            raise IndexError(i)
+        if i >= len(self.rows):
+            self.rows = topK(self.scores, max(i + 1, len(self.rows) + self.blockSize))
+        row = self.rows[i]
+        return int(row), float(self.scores[row])
+
+
+class StoredResults:
+    """
+    Recipes ordered from most to least similar, served from a recipe's precomputed
+    neighbour list with the recipe itself first (like RankedResults). The recipe is
+    only compared with every other recipe if something asks for a position past
+    the end of its list.
+    """
+
+    def __init__(self, engine, recipeIdx, indices, scores, blockSize=50):
+        """
+        :param engine: SimilarityEngine the neighbour list belongs to.
+        :param recipeIdx: Row of the recipe.
+        :param indices: The recipe's neighbour list (-1 for missing neighbours).
+        :param scores: Similarity of each neighbour.
+        :param blockSize: Number of recipes ranked each time more are needed.
+        """
+        valid = indices >= 0
+        self.engine = engine
+        self.recipeIdx = recipeIdx
+        self.blockSize = blockSize
+        self.size = engine.numActive()
+        row = engine.features[recipeIdx]
+        self.rows = [int(recipeIdx)] + indices[valid].tolist()
+        self.scores = [float(row.multiply(row).sum())] + scores[valid].tolist()
+        #every recipe ranked, only made if the neighbour list runs out
+        self.rest = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if i >= self.size:
+            raise IndexError(i)
+        if i >= len(self.rows):
+            if self.rest is None:
+                self.rest = iter(self.engine.rankScores(self.engine.similarity(self.recipeIdx), self.blockSize))
+                self.seen = set(self.rows)
+            #carry on with the full ranking, skipping the recipes already returned
+            while i >= len(self.rows):
+                row, score = next(self.rest)
+                if row not in self.seen:
+                    self.rows.append(row)
+                    self.scores.append(score)
+        return self.rows[i], self.scores[i]
+
+
+class SimilarityEngine:
+    """
+    Answers similarity queries against a sparse feature matrix. Rows are expected
+    to be L2 normalized (which recipeFeatures does) so the cosine
+    similarity between two recipes is just the dot product of their rows. Only
+    the rows needed for a query are ever multiplied, so memory grows with the
+    size of the feature matrix instead of with the number of recipes squared.
+    """
+
+    def __init__(self, featureVector, featuresT=None, removed=None, neighbourIdx=None, neighbourSim=None):
+        """
+        :param featureVector: Sparse (CSR) matrix with one L2 normalized row per recipe.
+        :param featuresT: Optional CSR copy of the transposed feature vectors (e.g. loaded
+                          from a saved index) so it does not have to be rebuilt.
+        :param removed: Optional boolean array marking recipes that were removed from an
+                        index and should never be returned.
+        :param neighbourIdx: Optional (N, k) array of each recipe's k most similar recipes
+                             (e.g. from a saved index), used to answer queries for a recipe
+                             that need at most k results without scoring every recipe.
+        :param neighbourSim: Similarity scores matching neighbourIdx.
+        """
+        self.features = sp.csr_matrix(featureVector, copy=False)
+        #transpose once so every query is a single sparse row times a CSR matrix
+        self.featuresT = featuresT if featuresT is not None else self.features.T.tocsr()
+        self.removed = removed if removed is not None and removed.any() else None
+        self.neighbourIdx = neighbourIdx
+        self.neighbourSim = neighbourSim
+
+    @classmethod
+    def fromIndex(cls, index):
+        """
+        :param index: RecipeIndex loaded from disk.
+        :return: SimilarityEngine over the index's feature vectors and neighbour lists.
+        """
+        return cls(index.features, index.featuresT, np.asarray(index.removed), index.neighbourIdx, index.neighbourSim)
+
+    def __len__(self):
+        return self.features.shape[0]
+
+    def numActive(self):
+        #number of recipes that can be returned
+        return len(self) if self.removed is None else len(self) - int(self.removed.sum())
+
+    def storedNeighbours(self, rows, k):
+        """
+        :param rows: Rows of the recipes.
+        :param k: Number of neighbours wanted for each recipe.
+        :return: (indices, scores) arrays like neighbours from the precomputed neighbour
+                 lists, or None if there are none or they hold fewer than k neighbours.
+        """
+        if self.neighbourIdx is None or k > self.neighbourIdx.shape[1]:
+            return None
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.array(self.neighbourIdx[rows, :k]), np.array(self.neighbourSim[rows, :k])
+
+    def similarity(self, recipeIdx):
+        """
+        Gets the similarity between a single recipe and every recipe in the corpus.
+
+        :param recipeIdx: Row of the recipe to compare against.
+        :return: Dense array of similarity scores, one per recipe.
+        """
+        return self.querySimilarity(self.features[recipeIdx])
+
+    def ranked(self, recipeIdx, blockSize=50):
+        """
+        :param recipeIdx: Row of the recipe to compare against.
+        :param blockSize: Number of recipes ranked each time more are needed.
+        :return: RankedResults (or StoredResults, when there are precomputed neighbour
+                 lists) of (row, similarity) pairs, most similar first.
+        """
+        if self.neighbourIdx is not None:
+            return StoredResults(self, recipeIdx, self.neighbourIdx[recipeIdx], self.neighbourSim[recipeIdx], blockSize)
+        return self.rankScores(self.similarity(recipeIdx), blockSize)
+
+    def rankScores(self, scores, blockSize=50):
+        """
+        :param scores: Array of scores, one per recipe (e.g. similarity blended with other scores).
+        :param blockSize: Number of recipes ranked each time more are needed.
+        :return: RankedResults of (row, score) pairs, highest first, without removed recipes.
+        """
+        return RankedResults(scores, blockSize, self.numActive())
+
+    def querySimilarity(self, queryVector):
+        """
+        Gets the similarity between an arbitrary query vector and every recipe.
+
+        :param queryVector: Sparse 1 x M row in the same feature space as the corpus.
+        :return: Dense array of similarity scores, one per recipe.
+        """
+        scores = (queryVector @ self.featuresT).toarray().ravel()
+        if self.removed is not None:
+            #removed recipes rank below everything else
+            scores[self.removed] = -np.inf
+        return scores
+
+    def neighbours(self, k=50, blockSize=1024, rows=None):
+        """
+        Precomputes the k most similar recipes for every recipe. Recipes are
+        compared a block of rows at a time and only the top k of each row is kept,
+        so the result takes N*k memory instead of N*N.
+
+        :param k: Number of neighbours to keep for each recipe.
+        :param blockSize: Number of recipes to compare at a time.
+        :param rows: Optional array of the rows to find neighbours for (defaults to all rows).
+        :return: (indices, scores) arrays of shape (len(rows), k). Missing neighbours have
+                 an index of -1 and a score of 0.
+        """
+        numRecipes = len(self)
+        rows = np.arange(numRecipes) if rows is None else np.asarray(rows, dtype=np.int64)
+        #read from the precomputed lists when they are long enough
+        stored = self.storedNeighbours(rows, min(k, max(numRecipes - 1, 0)))
+        if stored is not None:
+            return stored
+        k = min(k, max(numRecipes - 1, 0))
+        indices = np.full((len(rows), k), -1, dtype=np.int32)
+        scores = np.zeros((len(rows), k), dtype=np.float32)
+        if k == 0:
+            return indices, scores
+
+        for start in range(0, len(rows), blockSize):
+            blockRows = rows[start:start + blockSize]
+            block = (self.features[blockRows] @ self.featuresT).tocsr()
+            for i, recipe in enumerate(blockRows):
+                rowStart, rowEnd = block.indptr[i], block.indptr[i + 1]
+                cols = block.indices[rowStart:rowEnd]
+                vals = block.data[rowStart:rowEnd]
+                #a recipe is not its own neighbour
+                keep = cols != recipe
+                if self.removed is not None:
+                    keep &= ~self.removed[cols]
+                cols, vals = cols[keep], vals[keep]
+                top = topK(vals, k)
+                indices[start + i, :len(top)] = cols[top]
+                scores[start + i, :len(top)] = vals[top]
+        return indices, scores
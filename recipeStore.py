@@ -0,0 +1,166 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeStore.py
+#   Purpose:    Keeps the recipe information that is shown to
+#               the user (title, link and ingredients) in a
+#               form that can be looked up by row or title
+#               without scanning the whole dataset.
+#
+########################################################
+
+import ast
+from titleIndex import TitleIndex
+
+#columns that may hold the recipe's link, depending on the dataset it came from
+LINK_COLUMNS = ['url', 'link']
+
+
+class Recipe:
+    __slots__ = ('row', 'title', 'link', 'ingredients')
+
+    def __init__(self, row, title, link, ingredients):
+        self.row = row
+        self.title = title
+        self.link = link
+        self.ingredients = ingredients
+
+
+class RecipeStore:
+    """
+    Recipe information stored column by column, with the row of a recipe being
+    the same as its row in the feature vectors. Ingredient lists are parsed once
+    when the store is created.
+    """
+
+    def __init__(self, titles, links, ingredients):
+        """
+        :param titles: List of recipe titles.
+        :param links: List of recipe links.
+        :param ingredients: List of ingredient tuples.
+        """
+        self._titles = titles
+        self._links = links
+        self._ingredients = ingredients
+        self._rows = {}
+        for row, title in enumerate(titles):
+            #keep the first recipe when several share a title
+            self._rows.setdefault(title, row)
+        self._titleIndex = None
+
+    @classmethod
+    def fromSheet(cls, recipeSheet):
+        """
+        Builds a store from a dataframe of cleaned recipes.
+
+        :param recipeSheet: Dataframe with 'title' and 'ingredients' columns and a link column.
+        :return: RecipeStore with one record per dataframe row.
+        """
+        linkCol = next((col for col in LINK_COLUMNS if col in recipeSheet.columns), recipeSheet.columns[2])
+        titles = [str(title) for title in recipeSheet['title']]
+        links = [str(link) for link in recipeSheet[linkCol]]
+        ingredients = [tuple(ast.literal_eval(recipe)) for recipe in recipeSheet['ingredients']]
+        return cls(titles, links, ingredients)
+
+    @classmethod
+    def fromColumnar(cls, recipes):
+        """
+        :param recipes: ColumnarRecipes loaded by recipeColumnar.loadColumnar.
+        :return: RecipeStore with one record per recipe.
+        """
+        return cls(recipes.titles, recipes.links, recipes.ingredients())
+
+    @classmethod
+    def fromIndex(cls, index):
+        """
+        :param index: RecipeIndex loaded by recipeIndex.loadIndex.
+        :return: Store that reads recipes straight from the index's memory-mapped arrays.
+        """
+        return IndexedRecipeStore(index)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def __getitem__(self, row):
+        return Recipe(row, self._titles[row], self._links[row], self._ingredients[row])
+
+    def __contains__(self, title):
+        return title in self._rows
+
+    def findTitle(self, title):
+        """
+        :param title: Exact title of a recipe.
+        :return: Row of the recipe, or -1 if no recipe has that title.
+        """
+        return self._rows.get(title, -1)
+
+    def titleIndex(self):
+        """
+        :return: TitleIndex for close spelling and prefix searches, built the first time it is needed.
+        """
+        if self._titleIndex is None:
+            self._titleIndex = TitleIndex(self.titles)
+        return self._titleIndex
+
+    @property
+    def titles(self):
+        return self._titles
+
+    @property
+    def links(self):
+        return self._links
+
+    @property
+    def ingredients(self):
+        return self._ingredients
+
+
+class IndexedRecipeStore(RecipeStore):
+    """
+    Recipe store backed by a saved index. Records are decoded from the index
+    only when they are requested, so opening the store costs nothing.
+    """
+
+    def __init__(self, index):
+        self._index = index
+        self._titles = None
+        self._titleIndex = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, row):
+        return Recipe(row, self._index.title(row), self._index.link(row), self._index.ingredients(row))
+
+    def __contains__(self, title):
+        return self._index.findTitle(title) >= 0
+
+    def findTitle(self, title):
+        return self._index.findTitle(title)
+
+    def titleIndex(self):
+        if self._titleIndex is None:
+            #recipes removed from the index are never suggested
+            removed = self._index.removed if self._index.numRemoved else None
+            self._titleIndex = TitleIndex(self.titles, removed)
+        return self._titleIndex
+
+    @property
+    def titles(self):
+        #only decoded when something needs every title (e.g. the title index)
+        if self._titles is None:
+            self._titles = [self._index.title(row) for row in range(len(self))]
+        return self._titles
+
+    @property
+    def links(self):
+        return [self._index.link(row) for row in range(len(self))]
+
+    @property
+    def ingredients(self):
+        return [self._index.ingredients(row) for row in range(len(self))]
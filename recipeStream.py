@@ -0,0 +1,97 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   recipeStream.py
+#   Purpose:    Reads recipes from the 1M dataset's json file
+#               one at a time so the whole file never has to
+#               be loaded into memory.
+#
+########################################################
+
+import json
+
+#amount of the file read at a time
+READ_SIZE = 1 << 20
+
+
+def iterJSONArray(fileName, readSize=READ_SIZE):
+    """
+    Incrementally parses a file holding one json array, yielding its elements one
+    at a time. Only the element being parsed and the current block of the file
+    are kept in memory.
+
+    :param fileName: Path of the json file.
+    :param readSize: Number of characters read from the file at a time.
+    :return: Generator of the array's elements.
+    """
+    decoder = json.JSONDecoder()
+    with open(fileName, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        started = False
+        while True:
+            #skip whitespace and the commas between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                buffer, pos = f.read(readSize), 0
+                if not buffer:
+                    raise ValueError("Unexpected end of json file: " + fileName)
+                continue
+
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("Expected a json array in " + fileName)
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                #element continues past the end of the buffer
+                more = f.read(readSize)
+                if not more:
+                    raise
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            yield element
+            pos = end
+
+
+def iterRecipes(fileName):
+    """
+    Reads recipes from the 1M dataset (layer1.json) with each recipe's
+    ingredients reduced to a list of their text, which is the format the
+    cleaning algorithm works with.
+
+    :param fileName: Path of the 1M dataset json file.
+    :return: Generator of recipe dictionaries.
+    """
+    for recipe in iterJSONArray(fileName):
+        recipe['ingredients'] = [ingredient['text'] for ingredient in recipe.get('ingredients', [])]
+        yield recipe
+
+
+def iterBatches(items, batchSize):
+    """
+    :param items: Iterable to split up.
+    :param batchSize: Number of items in each batch.
+    :return: Generator of lists of up to batchSize items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,137 @@
+########################################################
+#
+#   Author:     Ryan Quinn
+#   Class:      Artificial Intelligence 1 (Independent Study)
+#   Professor:  Dr. Dylan Schwesinger
+#   Project:    Independent project
+#   Semester:   Fall 2022
+#
+#   Filename:   titleIndex.py
+#   Purpose:    Looks up recipe titles exactly, by close spelling
+#               and by prefix without comparing the search against
+#               every title.
+#
+########################################################
+
+import bisect
+import difflib
+import numpy as np
+from recipeSimilarity import topK
+
+#number of titles sharing the most trigrams with a search that are compared with difflib
+SHORTLIST = 100
+
+
+def trigrams(text):
+    """
+    :param text: Lowercase text.
+    :return: Set of every run of three characters in the text, padded so the
+             start and end of words count as well.
+    """
+    text = '  ' + ' '.join(text.split()) + ' '
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """
+    Title lookups for a list of recipe titles:
+     - exact titles through a dictionary
+     - close spellings through an inverted index from each character trigram to
+       the titles containing it, so only titles sharing trigrams with the search
+       are looked at, and only the best of those are compared with difflib
+     - prefixes through a binary search of the sorted titles
+    """
+
+    def __init__(self, titles, removed=None):
+        """
+        :param titles: List of recipe titles, in row order.
+        :param removed: Optional boolean array of rows to leave out.
+        """
+        self.rows = {}
+        for row, title in enumerate(titles):
+            #keep the first recipe when several share a title
+            if removed is None or not removed[row]:
+                self.rows.setdefault(title, row)
+        self.titles = list(self.rows)
+        self.lowered = [title.lower() for title in self.titles]
+
+        #posting lists of every trigram, stored back to back
+        gramIds = {}
+        gramCol = []
+        titleCol = []
+        for i, title in enumerate(self.lowered):
+            for gram in trigrams(title):
+                gramCol.append(gramIds.setdefault(gram, len(gramIds)))
+                titleCol.append(i)
+        gramCol = np.asarray(gramCol, dtype=np.int32)
+        titleCol = np.asarray(titleCol, dtype=np.int32)
+        self.gramIds = gramIds
+        self.postings = titleCol[np.argsort(gramCol, kind='stable')]
+        self.offsets = np.zeros(len(gramIds) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gramCol, minlength=len(gramIds)), out=self.offsets[1:])
+        self.gramCounts = np.bincount(titleCol, minlength=len(self.titles))
+
+        self.prefixOrder = sorted(range(len(self.titles)), key=self.lowered.__getitem__)
+        self.sortedTitles = [self.lowered[i] for i in self.prefixOrder]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, title):
+        return title in self.rows
+
+    def findTitle(self, title):
+        """
+        :param title: Exact title of a recipe.
+        :return: Row of the recipe, or -1 if no recipe has that title.
+        """
+        return self.rows.get(title, -1)
+
+    def closeMatches(self, title, n=3, cutoff=0.5):
+        """
+        Finds the titles spelled most like a search, the same way difflib's
+        get_close_matches does but only for titles that share trigrams with it.
+
+        :param title: Title to search for.
+        :param n: Most titles to return.
+        :param cutoff: Lowest difflib similarity ratio (0-1) a title may have.
+        :return: List of up to n titles, closest first.
+        """
+        query = title.lower()
+        queryGrams = trigrams(query)
+        grams = [self.gramIds[gram] for gram in queryGrams if gram in self.gramIds]
+        if not grams:
+            return []
+
+        #count the trigrams each title shares with the search
+        hits = np.concatenate([self.postings[self.offsets[g]:self.offsets[g + 1]] for g in grams])
+        candidates, shared = np.unique(hits, return_counts=True)
+        overlap = 2 * shared / (len(queryGrams) + self.gramCounts[candidates])
+        shortlist = candidates[topK(overlap, SHORTLIST)]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for i in shortlist.tolist():
+            matcher.set_seq1(self.lowered[i])
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, self.titles[i]))
+        scored.sort(key=lambda match: match[0], reverse=True)
+        return [match for ratio, match in scored[:n]]
+
+    def complete(self, prefix, n=10):
+        """
+        :param prefix: Start of a title (any case).
+        :param n: Most titles to return.
+        :return: List of up to n titles starting with the prefix, in alphabetical order.
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.sortedTitles, prefix)
+        matches = []
+        for i in range(start, min(start + n, len(self.sortedTitles))):
+            if not self.sortedTitles[i].startswith(prefix):
+                break
+            matches.append(self.titles[self.prefixOrder[i]])
+        return matches